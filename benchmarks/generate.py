@@ -0,0 +1,86 @@
+#################################################
+#
+#   Synthetic data for the benchmarks.
+#
+#   Every generator takes a size and a seed and
+#   returns the same data for the same arguments,
+#   so runs on different versions are comparable.
+
+import os
+import random
+import string
+from datetime import datetime, timedelta
+
+from savefile import SavedInventory
+from dailylog import DailyLogWriter, daily_log_name, FLUSH_ON_IDLE
+
+NUM_CATEGORIES = 40
+NUM_SOURCES = 12
+WORDS = ['mario', 'luigi', 'kirby', 'sonic', 'pikachu', 'zelda', 'link', 'samus', 'yoshi', 'peach',
+         'holo', 'glitter', 'mini', 'giant', 'classic', 'retro', 'neon', 'pastel', 'vinyl', 'acrylic']
+
+def category_names():
+    return ['Category ' + str(i) for i in range(NUM_CATEGORIES)]
+
+def source_names():
+    return ['Source ' + str(i) for i in range(NUM_SOURCES)]
+
+def product_name(rng, number):
+    return ' '.join(rng.sample(WORDS, 3)).title() + ' ' + ''.join(rng.choices(string.ascii_uppercase, k = 2)) + str(number)
+
+# A catalog of `size` items, as read_save() returns it
+
+def catalog(size, seed = 0):
+    rng = random.Random(seed)
+    saved = SavedInventory()
+    saved.categories = category_names()
+    saved.sources = source_names()
+    saved.deals = deal_table(seed)
+    saved.items = [(product_name(rng, number), rng.choice(saved.categories), rng.choice(saved.sources),
+                    round(rng.uniform(0.5, 40), 2), rng.randint(0, 200)) for number in range(size)]
+    return saved
+
+# Deals for half of the categories, alternating BOGO and BULK
+
+def deal_table(seed = 0):
+    rng = random.Random(seed)
+    deals = dict()
+    for number, category in enumerate(category_names()):
+        if number % 4 == 0:
+            deals[category] = ('BOGO', rng.randint(1, 3), rng.randint(1, 2))
+        elif number % 4 == 1:
+            deals[category] = ('BULK', rng.randint(2, 5), float(rng.randint(2, 10)))
+    return deals
+
+# A cart of `size` (category, price, quantity) lines
+
+def cart_lines(size, seed = 0):
+    rng = random.Random(seed)
+    categories = category_names()
+    return [(rng.choice(categories), round(rng.uniform(0.5, 40), 2), rng.randint(1, 5)) for _ in range(size)]
+
+# A day of `size` sales of 1 to 4 lines each, as (time, lines, amount)
+
+def sales(size, seed = 0, day = datetime(2024, 5, 1, 9)):
+    rng = random.Random(seed)
+    names = [product_name(rng, number) for number in range(max(50, size // 20))]
+    categories = category_names()
+    step = timedelta(hours = 10) / size
+    day_sales = []
+    for number in range(size):
+        lines = [(rng.choice(names), rng.choice(categories), rng.randint(1, 4)) for _ in range(rng.randint(1, 4))]
+        day_sales.append((day + step * number, lines, round(rng.uniform(1, 60), 2)))
+    return day_sales
+
+# Write a day of `size` sales to a daily log in log_dir, returning its path
+
+def daily_log(size, log_dir, seed = 0):
+    day_sales = sales(size, seed)
+    path = daily_log_name(day_sales[0][0].date(), log_dir)
+    if os.path.exists(path):
+        os.remove(path)
+    writer = DailyLogWriter(policy = FLUSH_ON_IDLE, log_dir = log_dir)
+    for when, lines, amount in day_sales:
+        writer.log_sale(lines, amount, when)
+    writer.close()
+    return path
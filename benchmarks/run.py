@@ -0,0 +1,264 @@
+#################################################
+#
+#   Benchmarks for the checkout and logging hot
+#   paths, run on synthetic data (generate.py)
+#   at 1k, 10k, 100k and 1M items, cart lines or
+#   sales:
+#
+#       pricing         calculate_sales_price()
+#                       on a whole cart
+#       cart_update     changing one line of a
+#                       Cart and repricing it
+#       fpn_save/load   text save files
+#       fpnb_save/load  binary save files
+#       lifetime_record one sale recorded to the
+#                       lifetime stats
+#       daily_log       sales appended to the
+#                       daily log
+#       log_parse       parse_daily_log() for the
+#                       charts
+#       search          SearchIndex.search() per
+#                       keystroke
+#       stock_value     value of every item in an
+#                       ItemStore
+#       reprice         Inventory.reprice() of one
+#                       category
+#       scan            Inventory.scan() of one
+#                       barcode into the cart
+#
+#   Results are written as JSON: the best, median
+#   and mean of the repeats, in seconds per
+#   operation. Pass --compare with an earlier
+#   results file to see the change and fail on
+#   regressions past --threshold.
+#
+#       python benchmarks/run.py --scales 1k 10k
+#       python benchmarks/run.py --compare old.json
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+import generate
+import pricing
+from savefile import write_fpn, read_fpn, write_fpnb, read_fpnb
+from lifetime import LifetimeStats, item_tag
+from dailylog import DailyLogWriter, FLUSH_ON_IDLE
+from search import SearchIndex
+from core import Inventory
+
+SCALES = {'1k': 1000, '10k': 10000, '100k': 100000, '1m': 1000000}
+DEFAULT_SCALES = ['1k', '10k', '100k']
+REPEAT = 5
+THRESHOLD = 1.2
+
+def measure(run, repeat, ops = 1, setup = None):
+    times = []
+    for _ in range(repeat):
+        state = setup() if setup is not None else None
+        start = time.perf_counter()
+        run(state)
+        times.append((time.perf_counter() - start) / ops)
+    return times
+
+#################################################
+# The benchmarks. Each takes the size and a
+# scratch directory and returns its timings.
+
+def bench_pricing(size, workdir, repeat):
+    lines = generate.cart_lines(size)
+    deals = generate.deal_table()
+    return measure(lambda state: pricing.calculate_sales_price(lines, deals), repeat)
+
+def bench_cart_update(size, workdir, repeat):
+    lines = generate.cart_lines(size)
+    cart = pricing.Cart(generate.deal_table())
+    for key, (category, price, quantity) in enumerate(lines):
+        cart.set_line(key, category, price, quantity)
+    cart.total()
+    updates = 1000
+
+    def run(state):
+        for key in range(updates):
+            category, price, quantity = lines[key % size]
+            cart.set_line(key % size, category, price, quantity % 5 + 1)
+            cart.total()
+    return measure(run, repeat, ops = updates)
+
+def bench_saves(size, workdir, repeat):
+    saved = generate.catalog(size)
+    results = dict()
+    for name, write, read in [('fpn', write_fpn, read_fpn), ('fpnb', write_fpnb, read_fpnb)]:
+        path = os.path.join(workdir, 'catalog.' + name)
+        results[name + '_save'] = measure(lambda state: write(path, ['-'] + saved.categories, saved.sources, saved.deals, saved.items), repeat)
+        results[name + '_load'] = measure(lambda state: read(path), repeat)
+    return results
+
+def bench_lifetime_record(size, workdir, repeat):
+    path = os.path.join(workdir, 'lifetime-logs')
+    stats = LifetimeStats(path, compact_every = sys.maxsize)
+    stats.counts = {item_tag(category, name): count for name, category, source, price, count in generate.catalog(size).items}
+    stats.compact()
+    sales = generate.sales(50)
+
+    def run(state):
+        for when, lines, amount in sales:
+            stats.record({item_tag(category, name): quantity for name, category, quantity in lines})
+    times = measure(run, repeat, ops = len(sales))
+    stats.close()
+    return times
+
+def bench_daily_log(size, workdir, repeat):
+    sales = generate.sales(size)
+
+    def run(log_dir):
+        writer = DailyLogWriter(policy = FLUSH_ON_IDLE, log_dir = log_dir)
+        for when, lines, amount in sales:
+            writer.log_sale(lines, amount, when)
+        writer.close()
+    return measure(run, repeat, ops = size, setup = lambda: tempfile.mkdtemp(dir = workdir))
+
+def bench_log_parse(size, workdir, repeat):
+    from salesdata import parse_daily_log
+    path = generate.daily_log(size, workdir)
+    return measure(lambda state: parse_daily_log(path), repeat)
+
+def bench_search(size, workdir, repeat):
+    index = SearchIndex()
+    for row, (name, category, source, price, count) in enumerate(generate.catalog(size).items):
+        index.add(row, name)
+    keystrokes = ['m', 'ma', 'mar', 'mari', 'mario', 'mario h', 'mario ho', 'mario hol', 'mario holo', '', 'z', 'ze', 'zel']
+
+    def run(state):
+        for query in keystrokes:
+            index.search(query)
+    return measure(run, repeat, ops = len(keystrokes))
+
+def bench_store(size, workdir, repeat):
+    inventory = Inventory()
+    inventory.items.extend(generate.catalog(size).items)
+    rows = inventory.items.category_mask([generate.category_names()[0]])
+    return {
+        'stock_value': measure(lambda state: inventory.stock_value(), repeat),
+        'reprice': measure(lambda state: inventory.reprice(rows, percent = 1), repeat),
+    }
+
+def bench_scan(size, workdir, repeat):
+    inventory = Inventory()
+    inventory.add_items([item + (f'{row:012d}',) for row, item in enumerate(generate.catalog(size).items)])
+    skus = [f'{row:012d}' for row in range(0, size, max(1, size // 100))]
+
+    def empty_cart():
+        inventory.cart.clear()
+        inventory.items.sell_counts[:] = 0
+
+    def run(state):
+        for sku in skus:
+            inventory.scan(sku)
+    return measure(run, repeat, ops = len(skus), setup = empty_cart)
+
+BENCHMARKS = {
+    'pricing': bench_pricing,
+    'cart_update': bench_cart_update,
+    'saves': bench_saves,
+    'lifetime_record': bench_lifetime_record,
+    'daily_log': bench_daily_log,
+    'log_parse': bench_log_parse,
+    'search': bench_search,
+    'store': bench_store,
+    'scan': bench_scan,
+}
+
+#################################################
+# Running, saving and comparing results.
+
+def version():
+    try:
+        return subprocess.run(['git', 'describe', '--always', '--dirty'], capture_output = True, text = True,
+                              cwd = os.path.dirname(os.path.abspath(__file__))).stdout.strip() or 'unknown'
+    except OSError:
+        return 'unknown'
+
+def summarize(name, scale, times):
+    return {
+        'benchmark': name,
+        'scale': scale,
+        'best': min(times),
+        'median': statistics.median(times),
+        'mean': statistics.mean(times),
+        'repeat': len(times),
+    }
+
+def run_benchmarks(names, scales, repeat):
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        for scale in scales:
+            for name in names:
+                timings = BENCHMARKS[name](SCALES[scale], workdir, repeat)
+                if not isinstance(timings, dict):
+                    timings = {name: timings}
+                for result_name, times in timings.items():
+                    result = summarize(result_name, scale, times)
+                    print(f"{result_name:16} {scale:>5}  {result['median'] * 1000:12.4f} ms/op")
+                    results.append(result)
+    return results
+
+def compare(results, old_results, threshold):
+    old = {(result['benchmark'], result['scale']): result for result in old_results}
+    regressions = 0
+    for result in results:
+        previous = old.get((result['benchmark'], result['scale']))
+        if previous is None:
+            continue
+        ratio = result['median'] / previous['median'] if previous['median'] else float('inf')
+        flag = ''
+        if ratio > threshold:
+            flag = '  REGRESSION'
+            regressions += 1
+        print(f"{result['benchmark']:16} {result['scale']:>5}  {ratio:6.2f}x{flag}")
+    return regressions
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = 'Benchmark the 4Peanuts hot paths')
+    parser.add_argument('--scales', nargs = '+', choices = list(SCALES), default = DEFAULT_SCALES)
+    parser.add_argument('--only', nargs = '+', choices = list(BENCHMARKS), default = list(BENCHMARKS))
+    parser.add_argument('--repeat', type = int, default = REPEAT)
+    parser.add_argument('--output', help = 'results file (default benchmarks/results/<version>.json)')
+    parser.add_argument('--compare', help = 'earlier results file to compare against')
+    parser.add_argument('--threshold', type = float, default = THRESHOLD, help = 'slowdown ratio counted as a regression')
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(args.only, args.scales, args.repeat)
+    report = {
+        'version': version(),
+        'date': datetime.now().isoformat(timespec = 'seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'unit': 'seconds per operation',
+        'results': results,
+    }
+    output = args.output or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results', report['version'] + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok = True)
+    with open(output, 'w') as f:
+        json.dump(report, f, indent = 2)
+    print('Results written to ' + output)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f)['results'], args.threshold)
+        if regressions:
+            print(str(regressions) + ' regressions')
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
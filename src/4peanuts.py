@@ -1,20 +1,27 @@
+import time
+STARTED_AT = time.perf_counter()
+
 import sys
 import PyQt6.QtWidgets as widgets
 from PyQt6.QtGui import QFont, QIntValidator, QIcon, QAction, QPalette
-from PyQt6.QtCore import Qt, QSize, QObject, QEvent
+from PyQt6.QtCore import Qt, QSize, QObject, QEvent, QAbstractTableModel, QAbstractListModel, QAbstractProxyModel, QConcatenateTablesProxyModel, QStringListModel, QModelIndex, QTimer, QThreadPool, pyqtSignal
 from qt_material import apply_stylesheet
 import os
+import importlib
+import threading
 from datetime import datetime
-from ast import literal_eval
 
-import pandas as pd
-import matplotlib.pyplot as plt
 import numpy as np
 
-from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.backends.backend_qtagg import NavigationToolbar2QT as NavigationToolbar
-from matplotlib.backends.qt_compat import QtWidgets
-from matplotlib.figure import Figure
+from core import Inventory, Item, NameList
+from filters import FilterEngine, STOCK_ALL, STOCK_IN, STOCK_LOW, STOCK_OUT
+from autosave import EditJournal, apply_entry
+from station import StationClient, StationJournal
+import perf
+from savefile import read_save, write_save
+from workers import Worker
+from lifetime import LifetimeStats
+from dailylog import DailyLogWriter, FLUSH_ON_IDLE
 
 # .png ICONS FROM FUGUE ICONS BY YUSUKE KAMIYAMANE AT https://p.yusukekamiyamane.com/
 # .svg ICONS FROM PYTHONGUIS.COM AT https://www.pythonguis.com/tutorials/custom-title-bar-pyqt6/
@@ -24,162 +31,435 @@ from matplotlib.figure import Figure
 # inner labels and boxes for each item.
 
 CATEGORY_WIDTH = 150
+SKU_WIDTH = 120
 PRICE_WIDTH = 80
 AMOUNT_WIDTH = 80
 SELL_COUNT_WIDTH = 80
 
-import matplotlib.dates as mdates
-from matplotlib.ticker import MaxNLocator
-halfHourFmt = mdates.DateFormatter('%H:%M')
-halfHourLoc = mdates.MinuteLocator([0,30])
+# Milliseconds to wait after the last keystroke before filtering
+
+SEARCH_DELAY_MS = 150
+
+# Choices of the stock filter (see filters.py), and the highest price the
+# price filter offers
+
+STOCK_FILTERS = [('All stock', STOCK_ALL), ('In stock', STOCK_IN), ('Low stock', STOCK_LOW), ('Out of stock', STOCK_OUT)]
+MAX_PRICE_FILTER = 100000.0
+
+# When daily log writes reach the disk (see dailylog.py)
+
+DAILY_LOG_POLICY = FLUSH_ON_IDLE
+DAILY_LOG_INTERVAL_MS = 500
+
+# Save files: text .fpn, or the binary .fpnb that opens faster (see savefile.py)
 
+SAVE_FILE_FILTER = "4Peanuts (*.fpn);;4Peanuts binary (*.fpnb)"
 
-import seaborn as sns
-sns.set_theme()
+# How often the performance overlay refreshes, and how often recorded
+# timings are written to the metrics file (see perf.py)
+
+PERF_OVERLAY_MS = 1000
+PERF_METRICS_MS = 60000
+
+# Station server the Connect dialog suggests (see server.py)
+
+STATION_ADDRESS = '127.0.0.1:4848'
 
 #################################################
+# The charts and the analytics stack behind them
+# (charts.py) are only imported when first used.
+# Once the window is up they are imported on a
+# background thread if CHARTS_PREWARM is set, so
+# the first chart opens without the wait.
 #
-#   class invItemWidget:
-#   
-#   Class that represents an item object.
-#   Item categories, sources, and deals for
-#   each category are stored as class variables.
-#   
-#   Each invItemWidget has the name, category,
-#   source, price, and count of the item it
-#   represents, and displays them all within
-#   the main scroll area.
-
-class invItemWidget(widgets.QWidget):
-
-    categories = ['-']
-    sources = ['-']
-    deals = {
-        '-' : None
-        }
-
-    # Add a new category to the class
-
-    @classmethod
-    def add_category(self, name):
-        invItemWidget.categories.append(name)
-        invItemWidget.categories.sort()
-        invItemWidget.deals.update({name : None})
-
-    # Add a new inventory source to the class
-
-    @classmethod
-    def add_source(self, name):
-        invItemWidget.sources.append(name)
-        invItemWidget.sources.sort()
-
-    # Initializer to create a new invItemWidget
-
-    def __init__(self, name = 'New Product', category = '-', source = '-', price = 0.0, count = 0, parent_window = None):
-        super(invItemWidget, self).__init__()
-        self.product_name = name
-        self.product_category = category
-        self.product_source = source
-        self.price = price
-        self.inv_count = count
-        self.parent_window = parent_window
-        
-        ### CREATION OF REPRESENTATIVE LABELS AND FIELDS
+# Time from launch until the window is usable is
+# shown in the status bar and compared against
+# STARTUP_BUDGET_MS.
 
-        # Field (LineEdit) that contains the name of the product
+CHARTS_PREWARM = True
+STARTUP_BUDGET_MS = 500
 
-        self.name_box = widgets.QLineEdit(self.product_name)
+def import_charts():
+    return importlib.import_module('charts')
 
-        # Field (ComboBox) that contains the category the product falls under
+#################################################
+#
+#   class NameListModel:
+#
+#   A NameList (see core.py) of category or
+#   source names as a Qt model, shared by every
+#   combobox that offers them. Adding a name
+#   costs the same however many items use it.
 
-        self.category_box = widgets.QComboBox()
-        self.category_box.addItems(invItemWidget.categories)
-        self.category_box.setFixedWidth(CATEGORY_WIDTH)
-        self.category_box.setInsertPolicy(widgets.QComboBox.InsertPolicy.InsertAlphabetically)
-        self.category_box.setCurrentIndex([self.category_box.itemText(i) for i in range(self.category_box.count())].index(self.product_category))
+class NameListModel(QAbstractListModel):
 
-        # Field (ComboBox) that contains the source where the item originates
+    def __init__(self, names = (), parent = None):
+        super().__init__(parent)
+        self.names = NameList(names)
+
+    def rowCount(self, parent = QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.names)
+
+    def data(self, index, role = Qt.ItemDataRole.DisplayRole):
+        if index.isValid() and role in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.EditRole):
+            return self.names[index.row()]
+        return None
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def row_of(self, name):
+        return self.names.row_of(name)
+
+    def add(self, name):
+        if name in self.names:
+            return False
+        row = self.names.position(name)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.names.add(name)
+        self.endInsertRows()
+        return True
+
+    # Add many names, returning the ones that were new. Names that sort
+    # together are inserted as one run of rows; a reset would clear the
+    # comboboxes' current names.
+
+    def add_many(self, names):
+        new_names = set(names).difference(self.names, [''])
+        runs = {}
+        for name in sorted(new_names):
+            runs.setdefault(self.names.position(name), []).append(name)
+        inserted = 0
+        for position, run in runs.items():
+            row = position + inserted
+            self.beginInsertRows(QModelIndex(), row, row + len(run) - 1)
+            self.names.insert(row, run)
+            self.endInsertRows()
+            inserted += len(run)
+        return new_names
 
-        self.source_box = widgets.QComboBox()
-        self.source_box.addItems(invItemWidget.sources)
-        self.source_box.setFixedWidth(CATEGORY_WIDTH)
-        self.source_box.setInsertPolicy(widgets.QComboBox.InsertPolicy.InsertAlphabetically)
-        self.source_box.setCurrentIndex([self.source_box.itemText(i) for i in range(self.source_box.count())].index(self.product_source))
-        
-        # Field (LineEdit) that contains the price of the item
-        
-        self.price_box = widgets.QLineEdit(str(self.price))
-        self.price_box.setFixedWidth(PRICE_WIDTH)
+#################################################
+#
+#   class InventoryModel:
+#
+#   Table model over the items of an Inventory
+#   (see core.py). The view only asks it for the
+#   rows on screen, so the cost of painting does
+#   not depend on how many items there are.
+#
+#   Edits are passed on to the Inventory, which
+#   keeps the search index and the cart up to
+#   date.
+
+NAME_COL, SKU_COL, CATEGORY_COL, SOURCE_COL, AMOUNT_COL, PRICE_COL, SELL_COL = range(7)
+COLUMN_HEADERS = ['Product', 'SKU', 'Category', 'Source', 'In Stock', 'Price', 'Sell']
+COLUMN_WIDTHS = {
+    SKU_COL : SKU_WIDTH,
+    CATEGORY_COL : CATEGORY_WIDTH,
+    SOURCE_COL : CATEGORY_WIDTH,
+    AMOUNT_COL : AMOUNT_WIDTH,
+    PRICE_COL : PRICE_WIDTH,
+    SELL_COL : SELL_COUNT_WIDTH,
+}
 
-        # Field (SpinBox) that contains the stock count of the item
+class InventoryModel(QAbstractTableModel):
 
-        self.amountBox = widgets.QSpinBox()
-        self.amountBox.setButtonSymbols(widgets.QAbstractSpinBox.ButtonSymbols.NoButtons)
-        self.amountBox.setRange(0,999)
-        self.amountBox.setFixedWidth(AMOUNT_WIDTH)
-        self.amountBox.setValue(self.inv_count)
+    # Emitted with a row whose contribution to the cart changed
 
-        # Field (SpinBox) that contains the amount of the item to sell
+    cartChanged = pyqtSignal(int)
 
-        self.sellCountBox = widgets.QSpinBox()
-        self.sellCountBox.setButtonSymbols(widgets.QAbstractSpinBox.ButtonSymbols.PlusMinus)
-        self.sellCountBox.setRange(0,self.inv_count)
-        self.sellCountBox.setFixedWidth(SELL_COUNT_WIDTH)
+    def __init__(self, inventory, parent = None):
+        super().__init__(parent)
+        self.inventory = inventory
+        self.items = inventory.items
+
+    def item_at(self, index):
+        return self.items[index.row()]
+
+    def rowCount(self, parent = QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.items)
+
+    def columnCount(self, parent = QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(COLUMN_HEADERS)
+
+    def headerData(self, section, orientation, role = Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return COLUMN_HEADERS[section]
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.ItemFlag.NoItemFlags
+        return Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable | Qt.ItemFlag.ItemIsEditable
+
+    def data(self, index, role = Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        item = self.items[index.row()]
+        column = index.column()
+        if role in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.EditRole):
+            if column == NAME_COL:
+                return item.product_name
+            elif column == SKU_COL:
+                return item.sku
+            elif column == CATEGORY_COL:
+                return item.product_category
+            elif column == SOURCE_COL:
+                return item.product_source
+            elif column == AMOUNT_COL:
+                return item.inv_count
+            elif column == PRICE_COL:
+                return str(item.price)
+            elif column == SELL_COL:
+                return item.sell_count
+        elif role == Qt.ItemDataRole.TextAlignmentRole and column != NAME_COL:
+            return Qt.AlignmentFlag.AlignCenter
+        return None
+
+    def setData(self, index, value, role = Qt.ItemDataRole.EditRole):
+        if not index.isValid() or role != Qt.ItemDataRole.EditRole:
+            return False
+        row = index.row()
+        item = self.items[row]
+        column = index.column()
+        if column == NAME_COL:
+            self.inventory.rename(row, value)
+        elif column == SKU_COL:
+            if not self.inventory.set_sku(row, value.strip()):
+                return False
+        elif column == CATEGORY_COL:
+            self.inventory.set_category(row, value)
+        elif column == SOURCE_COL:
+            self.inventory.set_source(row, value)
+        elif column == AMOUNT_COL:
+            if self.inventory.set_count(row, int(value)):
+                self.dataChanged.emit(self.index(row, SELL_COL), self.index(row, SELL_COL))
+                self.cartChanged.emit(row)
+        elif column == PRICE_COL:
+            try:
+                self.inventory.set_price(row, value)
+            except ValueError:
+                return False
+        elif column == SELL_COL:
+            if int(value) == item.sell_count:
+                return False
+            self.inventory.set_sell_count(row, int(value))
+        self.dataChanged.emit(index, index)
+        if column in (CATEGORY_COL, PRICE_COL, SELL_COL):
+            self.cartChanged.emit(row)
+        return True
+
+    # Add one of the item with this SKU to the cart. Returns its row, or
+    # None if no item has the SKU, and whether there was stock to add.
+
+    def scan(self, sku):
+        row = self.inventory.row_of_sku(sku)
+        if row is None:
+            return None, False
+        before = self.items[row].sell_count
+        self.inventory.scan(sku)
+        if self.items[row].sell_count == before:
+            return row, False
+        index = self.index(row, SELL_COL)
+        self.dataChanged.emit(index, index)
+        self.cartChanged.emit(row)
+        return row, True
+
+    def add_item(self, item):
+        self.add_items([item])
+
+    # Append many items as a single insertion, so the view lays out once
+
+    def add_items(self, items, index = None):
+        if not items:
+            return
+        first = len(self.items)
+        self.beginInsertRows(QModelIndex(), first, first + len(items) - 1)
+        self.inventory.add_items(items, index)
+        self.endInsertRows()
+
+    # Replace every item, as when a station takes the server's inventory
+
+    def replace_items(self, items, index = None):
+        self.beginResetModel()
+        self.inventory.clear_items()
+        self.inventory.add_items(items, index)
+        self.endResetModel()
+
+    # Tell the view that these rows changed
+
+    def refresh_rows(self, rows):
+        for row in rows:
+            self.dataChanged.emit(self.index(row, 0), self.index(row, len(COLUMN_HEADERS) - 1))
+
+    # Tell the view that the stock and sell counts of these rows changed
+
+    def refresh_counts(self, rows):
+        for row in rows:
+            self.dataChanged.emit(self.index(row, AMOUNT_COL), self.index(row, SELL_COL))
 
-        # Connect all of the above fields to the functions that update the inventory
+#################################################
+#
+#   class FilterProxyModel:
+#
+#   The rows of an InventoryModel that pass the
+#   filters, as the table shows them. Which rows
+#   those are is kept as NumPy arrays mapping
+#   table rows to inventory rows and back, so a
+#   new set of visible rows costs one reset of
+#   the view however many rows it hides.
+#
+#   Rows added to the inventory are shown until
+#   the filters are next applied.
 
-        self.category_box.currentTextChanged.connect(self.updateCategory)
-        self.source_box.currentTextChanged.connect(self.updateSource)
-        self.amountBox.editingFinished.connect(self.updateAmount)
-        self.name_box.editingFinished.connect(self.setName)
-        self.price_box.editingFinished.connect(self.setPrice)
-        self.sellCountBox.valueChanged.connect(parent_window.display_sell_price)
+class FilterProxyModel(QAbstractProxyModel):
 
-        self.hbox = widgets.QHBoxLayout()
-        self.hbox.addWidget(self.name_box)
-        self.hbox.addWidget(self.category_box)
-        self.hbox.addWidget(self.source_box)
-        self.hbox.addWidget(self.amountBox)
-        self.hbox.addWidget(self.price_box)
-        self.hbox.addWidget(self.sellCountBox)
+    def __init__(self, source, parent = None):
+        super().__init__(parent)
+        self.inventory = source.inventory
+        self.items = source.items
+        self.rows = np.arange(len(self.items))
+        self.positions = np.arange(len(self.items))
+        self.setSourceModel(source)
+        source.dataChanged.connect(self.source_data_changed)
+        source.rowsInserted.connect(self.source_rows_inserted)
+        source.modelAboutToBeReset.connect(self.beginResetModel)
+        source.modelReset.connect(lambda: self.show_rows(np.ones(len(self.items), dtype = bool), reset = False))
+
+    # Show the rows set in a bool array, one per inventory row
+
+    def show_rows(self, visible, reset = True):
+        if reset:
+            self.beginResetModel()
+        self.rows = np.flatnonzero(visible)
+        self.positions = np.full(len(visible), -1, dtype = np.intp)
+        self.positions[self.rows] = np.arange(len(self.rows))
+        self.endResetModel()
+
+    def item_at(self, index):
+        return self.items[int(self.rows[index.row()])]
+
+    def mapToSource(self, index):
+        if not index.isValid():
+            return QModelIndex()
+        return self.sourceModel().index(int(self.rows[index.row()]), index.column())
+
+    def mapFromSource(self, index):
+        if not index.isValid() or index.row() >= len(self.positions) or self.positions[index.row()] < 0:
+            return QModelIndex()
+        return self.index(int(self.positions[index.row()]), index.column())
+
+    def index(self, row, column, parent = QModelIndex()):
+        if parent.isValid() or not 0 <= row < len(self.rows):
+            return QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index = None):
+        return QModelIndex()
+
+    def rowCount(self, parent = QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.rows)
+
+    def columnCount(self, parent = QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self.sourceModel().columnCount()
+
+    def headerData(self, section, orientation, role = Qt.ItemDataRole.DisplayRole):
+        return self.sourceModel().headerData(section, orientation, role)
+
+    def source_data_changed(self, top_left, bottom_right, roles = ()):
+        for row in range(top_left.row(), bottom_right.row() + 1):
+            if row < len(self.positions) and self.positions[row] >= 0:
+                position = int(self.positions[row])
+                self.dataChanged.emit(self.index(position, top_left.column()), self.index(position, bottom_right.column()), roles)
+
+    def source_rows_inserted(self, parent, first, last):
+        new_rows = np.arange(first, last + 1)
+        self.beginInsertRows(QModelIndex(), len(self.rows), len(self.rows) + len(new_rows) - 1)
+        self.positions = np.concatenate([self.positions, np.arange(len(self.rows), len(self.rows) + len(new_rows))])
+        self.rows = np.concatenate([self.rows, new_rows])
+        self.endInsertRows()
 
-        self.setLayout(self.hbox)
+#################################################
+#
+#   class InventoryDelegate:
+#
+#   Creates the editing widgets for a cell only
+#   while that cell is being edited, instead of
+#   keeping a full set of fields alive per item.
+
+class InventoryDelegate(widgets.QStyledItemDelegate):
+
+    def createEditor(self, parent, option, index):
+        column = index.column()
+        item = index.model().item_at(index)
+        if column in (CATEGORY_COL, SOURCE_COL):
+            editor = widgets.QComboBox(parent)
+            inventory = index.model().inventory
+            editor.setModel(inventory.categories if column == CATEGORY_COL else inventory.sources)
+            editor.currentTextChanged.connect(lambda text, editor = editor: self.commitData.emit(editor))
+        elif column == AMOUNT_COL:
+            editor = widgets.QSpinBox(parent)
+            editor.setButtonSymbols(widgets.QAbstractSpinBox.ButtonSymbols.NoButtons)
+            editor.setRange(0,999)
+        elif column == SELL_COL:
+            editor = widgets.QSpinBox(parent)
+            editor.setButtonSymbols(widgets.QAbstractSpinBox.ButtonSymbols.PlusMinus)
+            editor.setRange(0,item.inv_count)
+            editor.valueChanged.connect(lambda value, editor = editor: self.commitData.emit(editor))
+        else:
+            editor = widgets.QLineEdit(parent)
+        return editor
+
+    def setEditorData(self, editor, index):
+        value = index.data(Qt.ItemDataRole.EditRole)
+        if isinstance(editor, widgets.QComboBox):
+            editor.blockSignals(True)
+            editor.setCurrentIndex(editor.model().row_of(value))
+            editor.blockSignals(False)
+        elif isinstance(editor, widgets.QSpinBox):
+            if index.column() == SELL_COL:
+                editor.setRange(0, index.model().item_at(index).inv_count)
+            editor.blockSignals(True)
+            editor.setValue(value)
+            editor.blockSignals(False)
+        else:
+            editor.setText(value)
+
+    def setModelData(self, editor, model, index):
+        if isinstance(editor, widgets.QComboBox):
+            model.setData(index, editor.currentText())
+        elif isinstance(editor, widgets.QSpinBox):
+            editor.interpretText()
+            model.setData(index, editor.value())
+        else:
+            model.setData(index, editor.text())
 
-    def setName(self):
-        self.product_name = self.name_box.text()
-    
-    def setPrice(self):
-        self.price = float(self.price_box.text())
-    
-    def updateAmount(self):
-        self.inv_count = self.amountBox.value()
-        self.sellCountBox.setRange(0,self.inv_count)
-
-    def complete_sale(self):
-        number_sold = self.sellCountBox.value()
-        new_amount = self.amountBox.value() - number_sold
-        self.sellCountBox.setValue(0)
-        self.amountBox.setValue(new_amount)
-        self.updateAmount()
-        sale = {
-            'category': self.product_category,
-            'price': self.price,
-        }
-        return sale, number_sold
-    
-    def updateCategory(self, name):
-        self.product_category = name
+class DealsDialog(widgets.QDialog):
 
-    def updateSource(self, name):
-        self.product_source = name
+    # Emitted with the category whose deal was saved
 
-    def __str__(self):
-        return ','.join([self.product_name, self.product_category, self. product_source, str(self.price), str(self.inv_count)])
+    dealChanged = pyqtSignal(str)
 
-class DealsDialog(widgets.QDialog):
-    def __init__(self, parent = None):
+    def __init__(self, inventory, parent = None):
         super().__init__(parent)
 
+        self.inventory = inventory
         self.setWindowTitle("Configure deals...")
         self.resize(600,400)
 
@@ -190,7 +470,7 @@ class DealsDialog(widgets.QDialog):
         self.inputContainer = widgets.QWidget()
         self.inputLayout = widgets.QHBoxLayout()
         self.catDropBox = widgets.QComboBox()
-        self.catDropBox.addItems(invItemWidget.categories)
+        self.catDropBox.setModel(self.inventory.categories)
 
         self.dealDropBox = widgets.QComboBox()
         self.dealDropBox.addItems(['-', 'BOGO', 'BULK'])
@@ -258,8 +538,8 @@ class DealsDialog(widgets.QDialog):
         self.dealLabels.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
         self.dealLabels.setWidgetResizable(True)
         self.dealLabelsLayout = widgets.QVBoxLayout()
-        for category in invItemWidget.categories:
-            if invItemWidget.deals[category] is not None:
+        for category in self.inventory.categories:
+            if self.inventory.deals[category] is not None:
                 self.dealLabelsLayout.addWidget(self.create_deal_entry(category))
         self.dealLabels.setLayout(self.dealLabelsLayout)
         self.dealLabelsLayout.addSpacerItem(widgets.QSpacerItem(1,1,widgets.QSizePolicy.Policy.Minimum, widgets.QSizePolicy.Policy.Expanding))
@@ -286,16 +566,17 @@ class DealsDialog(widgets.QDialog):
         category = self.catDropBox.currentText()
         deal = self.dealDropBox.currentText()
         if deal == 'NONE':
-            invItemWidget.deals.update({category : None})
+            self.inventory.set_deal(category, None)
         elif deal == 'BOGO':
-            invItemWidget.deals.update({category : ('BOGO', self.BOGOField1.value(), self.BOGOField2.value())})
+            self.inventory.set_deal(category, ('BOGO', self.BOGOField1.value(), self.BOGOField2.value()))
         elif deal == 'BULK':
-            invItemWidget.deals.update({category : ('BULK', self.BULKField1.value(), self.BULKField2.value())})
+            self.inventory.set_deal(category, ('BULK', self.BULKField1.value(), self.BULKField2.value()))
+        self.dealChanged.emit(category)
         self.accept()
 
     def create_deal_entry(self, category):
         cat_label = widgets.QLabel(category)
-        deal = invItemWidget.deals[category]
+        deal = self.inventory.deals[category]
         deal_type = deal[0]
         deal_string = ''
         if deal_type == 'BOGO':
@@ -389,161 +670,48 @@ class CustomTitleBar(widgets.QWidget):
             self.normal_button.setVisible(False)
             self.max_button.setVisible(True)
 
-class DataDialog(widgets.QDialog):
-    def __init__(self, parent = None):
-        super().__init__(parent)
-
-        self.setWindowTitle("Chart Sales Data")
-        self.resize(900,700)
-
-        # Get data
-
-        # Overall window layout
-
-        data_window_layout = widgets.QVBoxLayout()
-
-        # Label for date
-
-        self.data_date_label = widgets.QLabel("Select a log file to chart.")
-        self.data_date_label.setStyleSheet("font-size: 20px; qproperty-alignment: AlignCenter; font-weight: bold")
-        #self.data_date_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        self.data_date_label.setFixedHeight(50)
-        data_window_layout.addWidget(self.data_date_label)
-
-        # Charts
-
-        self.customers_over_time = FigureCanvas(Figure(figsize=(3, 3), dpi=80, tight_layout = True))
-        self.items_over_time = FigureCanvas(Figure(figsize=(3,3), dpi=80, tight_layout = True))
-        self.profit_over_time = FigureCanvas(Figure(figsize=(3, 3), dpi=80, tight_layout = True))
-        self.num_items_sold = FigureCanvas(Figure(figsize=(3, 3), dpi=80, tight_layout = True))
-
-        # Chart layout
-
-        chart_container = widgets.QWidget()
-        chart_container_layout = widgets.QGridLayout()
-        chart_container_layout.addWidget(self.customers_over_time, 0, 0)
-        chart_container_layout.addWidget(self.items_over_time, 0, 1)
-        chart_container_layout.addWidget(self.profit_over_time, 1, 0)
-        chart_container_layout.addWidget(self.num_items_sold, 1, 1)
-        chart_container.setLayout(chart_container_layout)
-        data_window_layout.addWidget(chart_container)
-
-        # Button to open data from file
+#################################################
+#
+#   class PerfOverlay:
+#
+#   Label floating over the top right of the
+#   window with the p50/p95/p99 latency of every
+#   timed operation, refreshed while shown.
 
-        open_data_button = widgets.QPushButton("Open Data Log")
-        open_data_button.setFixedWidth(200)
-        open_data_button.clicked.connect(self.read_file_data)
-        data_window_layout.addWidget(open_data_button, alignment = Qt.AlignmentFlag.AlignRight)
+class PerfOverlay(widgets.QLabel):
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.setStyleSheet("background-color: rgba(0, 0, 0, 180); color: white; font-family: monospace; padding: 8px")
+        self.setAttribute(Qt.WidgetAttribute.WA_TransparentForMouseEvents)
+        self.refreshTimer = QTimer(self)
+        self.refreshTimer.setInterval(PERF_OVERLAY_MS)
+        self.refreshTimer.timeout.connect(self.refresh)
+        self.hide()
+
+    def toggle(self, on):
+        self.setVisible(on)
+        if on:
+            self.refresh()
+            self.refreshTimer.start()
+        else:
+            self.refreshTimer.stop()
+
+    def refresh(self):
+        lines = [f"{'operation':24} {'n':>6} {'p50':>8} {'p95':>8} {'p99':>8}"]
+        for name, count, p50, p95, p99 in perf.summary():
+            lines.append(f'{name:24} {count:6} {p50 * 1000:6.2f}ms {p95 * 1000:6.2f}ms {p99 * 1000:6.2f}ms')
+        if len(lines) == 1:
+            lines.append('no timings recorded yet')
+        self.setText('\n'.join(lines))
+        self.adjustSize()
+        self.move(self.parent().width() - self.width() - 20, 80)
+        self.raise_()
 
-        # Set overall window layout
+class MainWindow(widgets.QMainWindow):
 
-        self.setLayout(data_window_layout)
+    # Emitted after each sale with (time, [(item, category, quantity)], amount)
 
-    def read_file_data(self):
-        filename, ok = widgets.QFileDialog.getOpenFileName(
-            self,
-            "Select a File", 
-            ".\\logs\\", 
-            "Text File (*.txt)"
-        )
-        if filename:
-            self.data_date_label.setText("Sales data for " + filename[-14:-4])
-            with open(filename, 'r') as f:
-                data_points = f.readlines()
-                cot_points = dict()
-                iot_points = dict()
-                total_profit = 0
-                pot_points = dict()
-                itemsold_points = dict()
-                for datum in data_points:
-                    if datum[0] == '$':
-                        profit, time, items = datum.split(' ')[1:4]
-                        profit, items = float(profit), int(items)
-                        total_profit += profit
-
-                        # Data for customers/items/profits over time
-
-                        if int(time[3:5]) >= 30:
-                            min = '30'
-                        else:
-                            min = '00'
-                        round_time_str = time[0:2] + ':' + min
-                        pot_points.update({ round_time_str : total_profit })
-                        if round_time_str in cot_points.keys():
-                            cot_points.update({ round_time_str : cot_points[round_time_str]+1 })
-                            iot_points.update({ round_time_str : iot_points[round_time_str]+items })
-                        else:
-                            cot_points.update({ round_time_str : 1 })
-                            iot_points.update({ round_time_str : items })
-                    else:
-                        item_name, item_cat = datum.replace('\n','').split(';')
-                        item_title = item_name + '\n(' + item_cat + ')'
-                        if item_title in itemsold_points.keys():
-                            itemsold_points.update({ item_title : itemsold_points[item_title]+1 })
-                        else:
-                            itemsold_points.update({ item_title : 1 })
-
-                rounded_times = [(datetime.strptime(time_str, '%H:%M')) for time_str in cot_points.keys()]
-
-                # Plot customers over time
-            
-                cot_axes = self.customers_over_time.figure.add_subplot()
-                cot_y = [cot_points[time_str] for time_str in cot_points.keys()]
-                cot_axes.xaxis.set_major_formatter(halfHourFmt)
-                cot_axes.xaxis.set_major_locator(halfHourLoc)
-                cot_axes.yaxis.set_major_locator(MaxNLocator(integer=True))
-                self.customers_over_time.figure.autofmt_xdate(rotation=70, ha='center')
-                cot_axes.bar(rounded_times, cot_y, width=0.02, color='mediumturquoise')
-                cot_axes.set_title('Customers Over Time')
-                cot_axes.set_xlabel('Time', labelpad=15)
-                cot_axes.set_ylabel('No. Customers', labelpad=15)
-                self.customers_over_time.draw()
-
-                # Plot items sold over time
-
-                iot_axes = self.items_over_time.figure.add_subplot()
-                iot_y = [iot_points[time_str] for time_str in iot_points.keys()]
-                iot_axes.xaxis.set_major_formatter(halfHourFmt)
-                iot_axes.xaxis.set_major_locator(halfHourLoc)
-                iot_axes.yaxis.set_major_locator(MaxNLocator(integer=True))
-                self.items_over_time.figure.autofmt_xdate(rotation=70, ha='center')
-                iot_axes.bar(rounded_times, iot_y, width=0.02, color='mediumspringgreen')
-                iot_axes.set_title('Items Sold Over Time')
-                iot_axes.set_xlabel('Time', labelpad=15)
-                iot_axes.set_ylabel('No. Items Sold', labelpad=15)
-                self.items_over_time.draw()
-
-                # Plot profit over time
-
-                pot_axes = self.profit_over_time.figure.add_subplot()
-                pot_y = [pot_points[time_str] for time_str in pot_points.keys()]
-                pot_axes.xaxis.set_major_formatter(halfHourFmt)
-                pot_axes.xaxis.set_major_locator(halfHourLoc)
-                pot_axes.yaxis.set_major_formatter('${x:3.2f}')
-                pot_axes.yaxis.set_major_locator(MaxNLocator(integer=True))
-                self.profit_over_time.figure.autofmt_xdate(rotation=70, ha='center')
-                pot_axes.plot(rounded_times, pot_y, color='gold')
-                pot_axes.set_title('Cumulative Profit Over Time')
-                pot_axes.set_xlabel('Time', labelpad=15)
-                pot_axes.set_ylabel('Total Profit', labelpad=15)
-                self.profit_over_time.draw()
-
-                # Plot number of each item sold
-
-                itemsold_axes = self.num_items_sold.figure.add_subplot()
-                itemsold_x = list(itemsold_points.keys())
-                itemsold_y = [itemsold_points[key] for key in itemsold_x]
-                itemsold_axes.barh(itemsold_x, itemsold_y, color='salmon')
-                itemsold_axes.xaxis.set_major_locator(MaxNLocator(integer=True))
-                itemsold_axes.set_xticklabels(itemsold_axes.get_xticklabels(), ha='center')
-                itemsold_axes.set_yticklabels(itemsold_axes.get_yticklabels(), ha='center')
-                itemsold_axes.tick_params(axis='y', which='major', pad=20)
-                itemsold_axes.set_title('Sales by Item')
-                itemsold_axes.set_xlabel('No. Sold', labelpad=15)
-                itemsold_axes.set_ylabel('Item and Category', labelpad=15)
-                self.num_items_sold.draw()
-
-class MainWindow(widgets.QMainWindow):
+    saleCompleted = pyqtSignal(object)
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -557,8 +725,22 @@ class MainWindow(widgets.QMainWindow):
         self.title_bar = CustomTitleBar(self)
 
         self.sources = {'-': None}
-        self.items = []
-        self.total_profit = 0.0
+        self.inventory = Inventory(
+            categories = NameListModel(['-'], self),
+            sources = NameListModel(['-'], self),
+            lifetime_stats = LifetimeStats(background = True),
+            daily_log = DailyLogWriter(policy = DAILY_LOG_POLICY, interval_ms = DAILY_LOG_INTERVAL_MS),
+            )
+
+        # Pick up where the last session left off, even if it crashed
+
+        self.autosave = EditJournal(self.inventory, background = True)
+        self.restored = self.autosave.load()
+        self.inventory.attach_journal(self.autosave)
+        self.items = self.inventory.items
+        self.live_sales = self.inventory.live_sales
+        self.dashboard = None
+        self.station = None
 
         # Dock for adding and configuring items and deals.
 
@@ -581,6 +763,16 @@ class MainWindow(widgets.QMainWindow):
 
         self.sellButton = widgets.QPushButton('Sell')
         self.sellButton.clicked.connect(self.sale_update_inventory)
+
+        # Barcode scanner input. A scanner types the code and Enter like
+        # a keyboard, so each scan arrives as one returnPressed. Shown by
+        # Scanner Mode, which keeps the focus here between scans.
+
+        self.scanBox = widgets.QLineEdit(self, placeholderText = 'Scan barcode...')
+        self.scanBox.returnPressed.connect(self.scan_item)
+        self.scanBox.setVisible(False)
+
+        self.addingMenuLayout.addWidget(self.scanBox)
         self.addingMenuLayout.addWidget(self.sellPriceLabel)
         self.addingMenuLayout.addWidget(self.profitLabel)
         self.addingMenuLayout.addWidget(self.sellButton)
@@ -606,73 +798,119 @@ class MainWindow(widgets.QMainWindow):
         self.sourceScroll.setLayout(self.sourceScrollLayout)
         self.sourcePanelLayout.addWidget(self.sourceScroll)
         self.sourcePanel.setLayout(self.sourcePanelLayout)
-
-        # Setup of inner item panel.
-
-        self.itemPanel = widgets.QWidget()
-        self.itemPanelLayout = widgets.QVBoxLayout()
-        self.itemPanelLayout.addSpacerItem(widgets.QSpacerItem(1,1,widgets.QSizePolicy.Policy.Minimum, widgets.QSizePolicy.Policy.Expanding))
-        self.itemPanel.setLayout(self.itemPanelLayout)
-
-        self.scroller = widgets.QScrollArea()
-        self.scroller.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOn)
-        self.scroller.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
-        self.scroller.setWidgetResizable(True)
-        self.scroller.setWidget(self.itemPanel)
+        for source in self.inventory.sources:
+            if source != '-':
+                self.add_source_check(source)
+
+        # Setup of inner item table. Only the rows on screen are painted,
+        # and editing fields are created for the focused cell alone.
+
+        self.inventoryModel = InventoryModel(self.inventory, self)
+        self.inventoryModel.cartChanged.connect(lambda row: self.display_sell_price())
+
+        self.itemTable = widgets.QTableView()
+        self.filterEngine = FilterEngine(self.inventory)
+        self.filterModel = FilterProxyModel(self.inventoryModel, self)
+        self.itemTable.setModel(self.filterModel)
+        self.itemTable.setItemDelegate(InventoryDelegate(self.itemTable))
+        self.itemTable.setEditTriggers(widgets.QAbstractItemView.EditTrigger.AllEditTriggers)
+        self.itemTable.setSelectionMode(widgets.QAbstractItemView.SelectionMode.SingleSelection)
+        self.itemTable.setVerticalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOn)
+        self.itemTable.setHorizontalScrollBarPolicy(Qt.ScrollBarPolicy.ScrollBarAlwaysOff)
+        self.itemTable.verticalHeader().setVisible(False)
+        self.itemTable.verticalHeader().setSectionResizeMode(widgets.QHeaderView.ResizeMode.Fixed)
+        self.itemTable.verticalHeader().setDefaultSectionSize(36)
+        self.itemTable.horizontalHeader().setSectionResizeMode(NAME_COL, widgets.QHeaderView.ResizeMode.Stretch)
+        for column, width in COLUMN_WIDTHS.items():
+            self.itemTable.horizontalHeader().setSectionResizeMode(column, widgets.QHeaderView.ResizeMode.Fixed)
+            self.itemTable.setColumnWidth(column, width)
 
         self.searchbar = widgets.QLineEdit()
         self.searchbar.setPlaceholderText('Search items...')
-        self.searchbar.textChanged.connect(self.update_display)
-
-        headers = widgets.QWidget()
-        headersLayout = widgets.QHBoxLayout()
-        headersLayout.addSpacerItem(widgets.QSpacerItem(40,1))
-        PROD_LABEL = widgets.QLabel('Product')
-        PROD_LABEL.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        headersLayout.addWidget(PROD_LABEL)
-        CAT_LABEL = widgets.QLabel('Category')
-        CAT_LABEL.setFixedWidth(CATEGORY_WIDTH)
-        CAT_LABEL.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        headersLayout.addWidget(CAT_LABEL)
-        SRC_LABEL = widgets.QLabel('Source')
-        SRC_LABEL.setFixedWidth(CATEGORY_WIDTH)
-        SRC_LABEL.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        headersLayout.addWidget(SRC_LABEL)
-        AMT_LABEL = widgets.QLabel('In Stock')
-        AMT_LABEL.setFixedWidth(AMOUNT_WIDTH)
-        AMT_LABEL.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        headersLayout.addWidget(AMT_LABEL)
-        PRC_LABEL = widgets.QLabel('Price')
-        PRC_LABEL.setFixedWidth(PRICE_WIDTH)
-        PRC_LABEL.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        headersLayout.addWidget(PRC_LABEL)
-        SELL_LABEL = widgets.QLabel('Sell')
-        SELL_LABEL.setFixedWidth(SELL_COUNT_WIDTH)
-        SELL_LABEL.setAlignment(Qt.AlignmentFlag.AlignCenter)
-        headersLayout.addWidget(SELL_LABEL)
-        headersLayout.addSpacerItem(widgets.QSpacerItem(30,1))
-        headers.setLayout(headersLayout)
+        self.searchTimer = QTimer(self)
+        self.searchTimer.setSingleShot(True)
+        self.searchTimer.setInterval(SEARCH_DELAY_MS)
+        self.searchTimer.timeout.connect(self.update_display)
+        self.searchbar.textChanged.connect(lambda text: self.searchTimer.start())
+
+        # Filters beside the search bar, applied with it
+
+        categoryFilterModel = QConcatenateTablesProxyModel(self)
+        categoryFilterModel.addSourceModel(QStringListModel(['All categories'], self))
+        categoryFilterModel.addSourceModel(self.inventory.categories)
+        self.categoryFilter = widgets.QComboBox()
+        self.categoryFilter.setModel(categoryFilterModel)
+        self.categoryFilter.setFixedWidth(CATEGORY_WIDTH)
+        self.categoryFilter.currentIndexChanged.connect(lambda index: self.searchTimer.start())
+
+        self.stockFilter = widgets.QComboBox()
+        for label, stock in STOCK_FILTERS:
+            self.stockFilter.addItem(label, stock)
+        self.stockFilter.currentIndexChanged.connect(lambda index: self.searchTimer.start())
+
+        self.minPriceBox = widgets.QDoubleSpinBox(prefix = '$', specialValueText = 'Min price', maximum = MAX_PRICE_FILTER)
+        self.maxPriceBox = widgets.QDoubleSpinBox(prefix = '$', specialValueText = 'Max price', maximum = MAX_PRICE_FILTER)
+        for box in (self.minPriceBox, self.maxPriceBox):
+            box.setFixedWidth(PRICE_WIDTH + 20)
+            box.valueChanged.connect(lambda value: self.searchTimer.start())
+
+        filterBar = widgets.QWidget()
+        filterBarLayout = widgets.QHBoxLayout()
+        filterBarLayout.setContentsMargins(0, 0, 0, 0)
+        filterBarLayout.addWidget(self.searchbar)
+        filterBarLayout.addWidget(self.categoryFilter)
+        filterBarLayout.addWidget(self.stockFilter)
+        filterBarLayout.addWidget(self.minPriceBox)
+        filterBarLayout.addWidget(self.maxPriceBox)
+        filterBar.setLayout(filterBarLayout)
 
         # File menu toolbar
 
         button_action = QAction(QIcon("icons/disk.png"), "&Save...", self)
-        button_action.setStatusTip("Save inventory to .txt file")
+        button_action.setStatusTip("Save inventory to .fpn or .fpnb file")
         button_action.triggered.connect(self.save_to_file)
         button_action.setCheckable(True)
 
         button_action2 = QAction(QIcon("icons/folder-open.png"), "&Open...", self)
-        button_action2.setStatusTip("Open items from .txt file")
+        button_action2.setStatusTip("Open items from .fpn or .fpnb file")
         button_action2.triggered.connect(self.open_from_file)
         button_action2.setCheckable(True)
 
         self.setStatusBar(widgets.QStatusBar(self))
 
+        # Saving and opening run on a worker thread, one at a time, with
+        # their progress and a cancel button in the status bar
+
+        self.file_pool = QThreadPool(self)
+        self.file_pool.setMaxThreadCount(1)
+        self.file_task = None
+        self.fileProgress = widgets.QProgressBar()
+        self.fileProgress.setFixedWidth(200)
+        self.fileProgress.setVisible(False)
+        self.cancelFileButton = widgets.QPushButton('Cancel')
+        self.cancelFileButton.clicked.connect(self.cancel_file_task)
+        self.cancelFileButton.setVisible(False)
+        self.statusBar().addPermanentWidget(self.fileProgress)
+        self.statusBar().addPermanentWidget(self.cancelFileButton)
+
         self.menu = widgets.QMenuBar()
         file_menu = self.menu.addMenu("&File")
         file_menu.addAction(button_action)
         file_menu.addAction(button_action2)
         file_menu.addSeparator()
 
+        self.connect_station_action = QAction("&Connect to Station...", self)
+        self.connect_station_action.setStatusTip("Share one inventory with the other registers through a station server")
+        self.connect_station_action.triggered.connect(self.connect_station)
+
+        self.disconnect_station_action = QAction("&Disconnect from Station", self)
+        self.disconnect_station_action.setStatusTip("Work on this register's own inventory again")
+        self.disconnect_station_action.triggered.connect(self.disconnect_station)
+        self.disconnect_station_action.setEnabled(False)
+
+        file_menu.addAction(self.connect_station_action)
+        file_menu.addAction(self.disconnect_station_action)
+
         # Settings menu toolbar
 
         deals_action = QAction(QIcon("icons/smiley-money.png"), "&Configure Deals...", self)
@@ -680,9 +918,32 @@ class MainWindow(widgets.QMainWindow):
         deals_action.triggered.connect(self.open_deal_dialog)
         deals_action.setCheckable(True)
 
+        self.record_perf_action = QAction("&Record Timings", self)
+        self.record_perf_action.setStatusTip("Time checkout and loading and write the timings to logs/metrics.jsonl")
+        self.record_perf_action.setCheckable(True)
+        self.record_perf_action.setChecked(perf.enabled)
+        self.record_perf_action.toggled.connect(self.record_timings)
+
+        self.perf_overlay_action = QAction("Performance &Overlay", self)
+        self.perf_overlay_action.setStatusTip("Show p50/p95/p99 latencies of timed operations")
+        self.perf_overlay_action.setShortcut("Ctrl+Shift+P")
+        self.perf_overlay_action.setCheckable(True)
+        self.perf_overlay_action.toggled.connect(self.toggle_perf_overlay)
+        self.addAction(self.perf_overlay_action)
+
+        self.scanner_mode_action = QAction("&Scanner Mode", self)
+        self.scanner_mode_action.setStatusTip("Ring up items by scanning their barcodes")
+        self.scanner_mode_action.setShortcut("F9")
+        self.scanner_mode_action.setCheckable(True)
+        self.scanner_mode_action.toggled.connect(self.toggle_scanner_mode)
+        self.addAction(self.scanner_mode_action)
+
         settings_menu = self.menu.addMenu("&Settings")
         settings_menu.addAction(deals_action)
+        settings_menu.addAction(self.scanner_mode_action)
         settings_menu.addSeparator()
+        settings_menu.addAction(self.record_perf_action)
+        settings_menu.addAction(self.perf_overlay_action)
 
         # Data menu toolbar
 
@@ -691,17 +952,21 @@ class MainWindow(widgets.QMainWindow):
         chart_data_action.triggered.connect(self.open_data_dialog)
         chart_data_action.setCheckable(True)
 
+        live_dashboard_action = QAction(QIcon("icons/chart.png"), "&Live Dashboard", self)
+        live_dashboard_action.setStatusTip("Chart today's sales as they happen")
+        live_dashboard_action.triggered.connect(self.open_live_dashboard)
+
         data_menu = self.menu.addMenu("&Data")
         data_menu.addAction(chart_data_action)
+        data_menu.addAction(live_dashboard_action)
         data_menu.addSeparator()
 
         # Container for main app
 
         itemContainer = widgets.QWidget()
         itemContainerLayout = widgets.QVBoxLayout()
-        itemContainerLayout.addWidget(self.searchbar)
-        itemContainerLayout.addWidget(headers)
-        itemContainerLayout.addWidget(self.scroller)
+        itemContainerLayout.addWidget(filterBar)
+        itemContainerLayout.addWidget(self.itemTable)
         itemContainer.setLayout(itemContainerLayout)
 
         lowerContainer = widgets.QWidget()
@@ -722,32 +987,62 @@ class MainWindow(widgets.QMainWindow):
 
         self.setCentralWidget(overallContainer)
 
-        self.setVisible(True)
+        self.perfOverlay = PerfOverlay(self)
+        self.metricsTimer = QTimer(self)
+        self.metricsTimer.setInterval(PERF_METRICS_MS)
+        self.metricsTimer.timeout.connect(perf.write_metrics)
+        if perf.enabled:
+            self.metricsTimer.start()
 
+        self.setVisible(True)
+        QTimer.singleShot(0, self.startup_finished)
+
+    # Runs once the event loop has shown the window
+
+    def startup_finished(self):
+        startup_ms = (time.perf_counter() - STARTED_AT) * 1000
+        message = f'Ready in {startup_ms:.0f} ms'
+        if startup_ms > STARTUP_BUDGET_MS:
+            message += f' (over the {STARTUP_BUDGET_MS} ms budget)'
+        if self.restored:
+            message += f', restored {len(self.items)} items from autosave'
+        self.statusBar().showMessage(message, 10000)
+        if CHARTS_PREWARM:
+            threading.Thread(target = import_charts, name = 'ChartsPrewarm', daemon = True).start()
+
+    # Show the rows passing the search text, the filter bar and the
+    # source checkboxes. Keystrokes and toggles are coalesced by
+    # searchTimer, and only the filters that changed are recomputed
+    # (see filters.py).
+
+    @perf.timed('update_display')
     def update_display(self):
-        for item in self.items:
-            item.setVisible(False)
-            if self.searchbar.text().lower() in item.product_name.lower() and item.product_source == '-':
-                item.setVisible(True)
-            if self.searchbar.text().lower() in item.product_name.lower() and self.sources[item.product_source] is not None:
-                    if self.sources[item.product_source].isChecked():
-                        item.setVisible(True)
-
-    def add_item(self, pad = None, name = 'New Product', category = '-', source = '-', price = 0.0, count = 0, parent_window = None):
-        new_item = invItemWidget(name = name, category = category, source = source, price = price, count = count, parent_window = self)
-        self.items.append(new_item)
-        self.itemPanelLayout.insertWidget(self.itemPanelLayout.count()-1, new_item)
-        self.itemPanel.setLayout(self.itemPanelLayout)
+        engine = self.filterEngine
+        engine.set_query(self.searchbar.text())
+        category = self.categoryFilter.currentIndex()
+        engine.set_categories([self.categoryFilter.currentText()] if category > 0 else None)
+        unchecked = [src for src, check in self.sources.items() if check is not None and not check.isChecked()]
+        engine.set_sources([src for src, check in self.sources.items() if check is None or check.isChecked()] if unchecked else None)
+        engine.set_stock(self.stockFilter.currentData())
+        engine.set_price_range(self.minPriceBox.value() or None, self.maxPriceBox.value() or None)
+        self.filterModel.show_rows(engine.visible())
+
+    # At a station the server adds the item, and it appears with the
+    # server's update
+
+    def add_item(self, pad = None, name = 'New Product', category = '-', source = '-', price = 0.0, count = 0):
+        new_item = Item(name = name, category = category, source = source, price = price, count = count)
+        if self.station is not None:
+            self.station.add_items([new_item])
+            return
+        self.inventoryModel.add_item(new_item)
 
     def add_new_category(self, name = None):
         if isinstance(name, str):
             new_category = name
         else:
             new_category = self.addCategoryBox.text()
-        if new_category != '' and new_category not in invItemWidget.categories:
-            invItemWidget.add_category(new_category)
-            for item in self.items:
-                item.category_box.addItem(new_category)
+        self.inventory.add_category(new_category)
         self.addCategoryBox.clear()
 
     def add_new_source(self, name = None):
@@ -755,150 +1050,349 @@ class MainWindow(widgets.QMainWindow):
             new_source = name
         else:
             new_source = self.addSourceBox.text()
-        if new_source != '' and new_source not in invItemWidget.sources:
-            invItemWidget.add_source(new_source)
-            for item in self.items:
-                item.source_box.addItem(new_source)
-            source_check = widgets.QCheckBox(new_source, self)
-            source_check.setChecked(True)
-            source_check.stateChanged.connect(self.update_display)
-            self.sources.update({new_source: source_check})
-            self.sourceScrollLayout.insertWidget(self.sourceScrollLayout.count()-1, source_check)
+        if self.inventory.add_source(new_source):
+            self.add_source_check(new_source)
         self.addSourceBox.clear()
 
-    def calculate_sales_price(self, sales):
-        sales_price = 0
-        cat_lists = dict()
-        for cat in invItemWidget.categories:
-            cat_list = [sale['price'] for sale in sales if sale['category'] == cat]
-            cat_list.sort()
-            if cat_list != []:
-                cat_lists.update({cat : cat_list})
-        for cat in cat_lists.keys():
-            deal = invItemWidget.deals[cat]
-            if deal is not None:
-                num_bought = len(cat_lists[cat])
-                if deal[0] == 'BOGO':
-                    times = (num_bought // (deal[1]+deal[2])) * deal[2]
-                    for i in range(times):
-                        cat_lists[cat].pop(0)
-                elif deal[0] == 'BULK':
-                    times = num_bought // deal[1]
-                    for i in range(times):
-                        for j in range(deal[1]):
-                            cat_lists[cat].pop(0)
-                        cat_lists[cat].append(deal[2])
-                else:
-                    pass
-        sales_price = sum([sum(cat) for cat in cat_lists.values()])
-        return sales_price
-    
+    def add_source_check(self, source):
+        source_check = widgets.QCheckBox(source, self)
+        source_check.setChecked(True)
+        source_check.stateChanged.connect(lambda state: self.searchTimer.start())
+        self.sources.update({source: source_check})
+        self.sourceScrollLayout.insertWidget(self.sourceScrollLayout.count()-1, source_check)
+
+    @perf.timed('display_sell_price')
     def display_sell_price(self):
-        sales = []
-        for item in self.items:
-            sale = {
-            'category': item.product_category,
-            'price': item.price,
-        }
-            num_sold = item.sellCountBox.value()
-            sales += [sale] * num_sold
-        self.sellPriceLabel.setText(f'Sales Price:   ${self.calculate_sales_price(sales):.2f}')
+        self.sellPriceLabel.setText(f'Sales Price:   ${self.inventory.cart_total():.2f}')
+
+    # In scanner mode the Sell button takes no focus, so the next
+    # customer's scans still land in the scan box
+
+    def toggle_scanner_mode(self, on):
+        self.scanBox.setVisible(on)
+        self.sellButton.setFocusPolicy(Qt.FocusPolicy.NoFocus if on else Qt.FocusPolicy.StrongFocus)
+        if on:
+            self.scanBox.setFocus()
+
+    def scan_item(self):
+        sku = self.scanBox.text().strip()
+        self.scanBox.clear()
+        if not sku:
+            return
+        row, added = self.inventoryModel.scan(sku)
+        if row is None:
+            widgets.QApplication.beep()
+            self.statusBar().showMessage(f'No item has SKU {sku}', 5000)
+            return
+        if not added:
+            widgets.QApplication.beep()
+            self.statusBar().showMessage(f'No more {self.items[row].product_name} in stock', 5000)
+        index = self.filterModel.mapFromSource(self.inventoryModel.index(row, SELL_COL))
+        if index.isValid():
+            self.itemTable.scrollTo(index)
 
     def sale_update_inventory(self):
-        sales = []
-        sales_stat_info = []
-        for item in self.items:
-            sale, num_sold = item.complete_sale()
-            sales += [sale] * num_sold
-            sale_copy = sale.copy()
-            sale_copy.update({'item' : item.product_name})
-            sales_stat_info += [sale_copy] * num_sold
-        sale_amount = self.calculate_sales_price(sales)
-        self.increase_profit(sale_amount)
-        self.update_lifetime_stats(sales_stat_info)
-        self.update_daily_stats(sales_stat_info, sale_amount)
-
-    def increase_profit(self, amount):
-        self.total_profit += amount
-        self.profitLabel.setText(f"Today's Profit: ${self.total_profit:.2f}")
+        if self.station is not None:
+            self.sell_at_station()
+            return
+        started = time.perf_counter()
+        with perf.measure('sell'):
+            sold_rows, sale = self.inventory.complete_sale()
+            self.inventoryModel.refresh_counts(sold_rows)
+            self.display_sell_price()
+            self.profitLabel.setText(f"Today's Profit: ${self.inventory.total_profit:.2f}")
+            self.saleCompleted.emit(sale)
+        self.check_writers()
+
+        # Time until the event loop is free again, which includes
+        # repainting the table and labels
+
+        if perf.enabled:
+            QTimer.singleShot(0, lambda: perf.record('sell_until_idle', time.perf_counter() - started))
+
+    # The lifetime stats, daily log and autosave are written by threads,
+    # which keep a failed write in error. Warn about each failure once.
+
+    def check_writers(self):
+        writers = [
+            ('lifetime stats', self.inventory.lifetime_stats),
+            ('daily log', self.inventory.daily_log),
+            ('autosave', self.autosave),
+        ]
+        for label, writer in writers:
+            if writer is None or writer.error is None:
+                continue
+            error, writer.error = writer.error, None
+            widgets.QMessageBox.warning(self, 'Not Saved', f'Could not write the {label}: {error}')
+
+    #################################################
+    # Sharing the inventory through a station
+    # server. While connected the server owns the
+    # stock, autosave and logs: changes made here
+    # are sent to it, and it pushes back the
+    # changes made at every station.
+
+    def connect_station(self):
+        address, ok = widgets.QInputDialog.getText(self, "Connect to Station", "Station server address:", text = STATION_ADDRESS)
+        host, _, port = address.strip().rpartition(':')
+        if not ok or not host or not port.isdigit():
+            return
+        self.station = StationClient(self)
+        self.station.connected.connect(self.station_connected)
+        self.station.updated.connect(self.apply_station_updates)
+        self.station.failed.connect(self.station_failed)
+        self.station.disconnected.connect(self.station_lost)
+        self.station.connect_to(host, int(port))
+        self.connect_station_action.setEnabled(False)
+        self.statusBar().showMessage(f'Connecting to {host}:{port}...')
+
+    # Take the server's inventory in place of ours. The local autosave
+    # still holds ours until we disconnect.
+
+    def station_connected(self, saved):
+        self.inventory.attach_journal(None)
+        self.setUpdatesEnabled(False)
+        try:
+            self.inventoryModel.replace_items([])
+            self.load_inventory(saved)
+        finally:
+            self.setUpdatesEnabled(True)
+        self.inventory.attach_journal(StationJournal(self.inventory, self.station))
+        self.display_sell_price()
+        self.disconnect_station_action.setEnabled(True)
+        self.statusBar().showMessage(f'Connected, sharing {len(self.items)} items', 10000)
+
+    def apply_station_updates(self, entries):
+        journal = self.inventory.journal
+        self.inventory.attach_journal(None)
+        rows = []
+        try:
+            for entry in entries:
+                if 'item' in entry:
+                    rows.append(entry['item'])
+                if 'item' in entry and entry['item'] >= len(self.items):
+                    self.inventoryModel.add_item(Item(*entry['fields']))
+                    continue
+                apply_entry(self.inventory, entry)
+                if 'item' in entry:
+                    self.inventoryModel.refresh_rows([entry['item']])
+                elif 'source' in entry and entry['source'] not in self.sources:
+                    self.add_source_check(entry['source'])
+        finally:
+            self.inventory.attach_journal(journal)
+        if isinstance(journal, StationJournal):
+            journal.synced(rows)
+        self.display_sell_price()
+        self.searchTimer.start()
+
+    # Ring up the cart at the server, which checks the stock of every
+    # line and takes the sale whole or not at all
+
+    def sell_at_station(self):
+        lines = [[row, self.items[row].product_name, self.items[row].sell_count] for row in self.inventory.cart.lines]
+        if not lines:
+            return
+        self.sellButton.setEnabled(False)
+        self.station.request('sell', lambda reply: self.station_sale_done(reply, lines), lines = lines, time = datetime.now().isoformat())
+
+    def station_sale_done(self, reply, lines):
+        self.sellButton.setEnabled(True)
+        if not reply['ok']:
+            self.statusBar().showMessage('Sale not completed: ' + reply['error'], 10000)
+            return
+        rows = [row for row, name, quantity in lines]
+        for row in rows:
+            self.inventory.set_sell_count(row, 0)
+        self.inventoryModel.refresh_counts(rows)
+        sale = (datetime.fromisoformat(reply['time']), [tuple(line) for line in reply['lines']], reply['amount'])
+        self.inventory.total_profit += sale[2]
+        self.live_sales.add_sale(*sale)
+        self.display_sell_price()
+        self.profitLabel.setText(f"Today's Profit: ${self.inventory.total_profit:.2f}")
+        self.saleCompleted.emit(sale)
+
+    def station_failed(self, message):
+        self.disconnect_station()
+        self.statusBar().showMessage('Station server: ' + message, 10000)
+
+    # Go back to the local autosave, starting from the last inventory
+    # the server sent
+
+    def disconnect_station(self):
+        if self.station is None:
+            return
+        station, self.station = self.station, None
+        station.disconnected.disconnect(self.station_lost)
+        station.close()
+        station.deleteLater()
+        if isinstance(self.inventory.journal, StationJournal):
+            self.inventory.attach_journal(self.autosave)
+            self.autosave.compact()
+        self.sellButton.setEnabled(True)
+        self.connect_station_action.setEnabled(True)
+        self.disconnect_station_action.setEnabled(False)
+
+    def station_lost(self):
+        if self.station is not None:
+            self.disconnect_station()
+            self.statusBar().showMessage('Disconnected from the station server, working on this register alone', 10000)
 
     def open_deal_dialog(self):
-        dlg = DealsDialog(self)
+        dlg = DealsDialog(self.inventory, self)
+        dlg.dealChanged.connect(self.deal_changed)
         dlg.exec()
+
+    def deal_changed(self, category):
+        self.display_sell_price()
     
+    # Run a Worker made with_progress on the file thread. finished is
+    # called on the GUI thread with its result.
+
+    def start_file_task(self, label, worker, finished):
+        if self.file_task is not None:
+            self.statusBar().showMessage('Wait for the current save or open to finish', 5000)
+            return
+        self.file_task = worker
+        worker.signals.progress.connect(self.show_file_progress)
+        worker.signals.finished.connect(lambda result: self.end_file_task())
+        worker.signals.finished.connect(finished)
+        worker.signals.error.connect(lambda message: self.end_file_task(label + ' failed: ' + message))
+        worker.signals.cancelled.connect(lambda: self.end_file_task(label + ' cancelled'))
+        self.fileProgress.setRange(0, 0)
+        self.fileProgress.setVisible(True)
+        self.cancelFileButton.setVisible(True)
+        self.statusBar().showMessage(label + '...')
+        self.file_pool.start(worker)
+
+    def show_file_progress(self, done, total):
+        self.fileProgress.setRange(0, total)
+        self.fileProgress.setValue(done)
+
+    def cancel_file_task(self):
+        if self.file_task is not None:
+            self.file_task.cancel()
+
+    def end_file_task(self, message = None):
+        self.file_task = None
+        self.fileProgress.setVisible(False)
+        self.cancelFileButton.setVisible(False)
+        if message is None:
+            self.statusBar().clearMessage()
+        else:
+            self.statusBar().showMessage(message, 10000)
+
+    # The items are copied here and written on the file thread, so edits
+    # made while saving go in the next save
+
     def save_to_file(self):
-        filename, ok = widgets.QFileDialog.getSaveFileName(self,"Save File",".\\saves\\","4Peanuts (*.fpn)")
-        with open(filename, 'w+') as f:
-            f.write('$ CATEGORIES\n')
-            f.writelines([cat + '\n' for cat in invItemWidget.categories if cat != '-'])
-            f.write('$ SOURCES\n')
-            f.writelines([src + '\n' for src in invItemWidget.sources if src != '-'])
-            f.write('$ DEALS\n')
-            f.writelines([str(category) + ':' + str(invItemWidget.deals[category]) + '\n' for category in invItemWidget.deals.keys() if invItemWidget.deals[category] is not None])
-            f.write('$ ITEMS\n')
-            f.writelines([str(item) + '\n' for item in self.items])
-            
+        filename, ok = widgets.QFileDialog.getSaveFileName(self,"Save File",".\\saves\\",SAVE_FILE_FILTER)
+        if filename:
+            state = self.inventory.save_state()
+            worker = Worker(write_save, filename, *state, with_progress = True)
+            self.start_file_task('Saving ' + os.path.basename(filename), worker,
+                                 lambda result: self.statusBar().showMessage(f'Saved {len(state[3])} items to {filename}', 10000))
 
     def open_from_file(self):
         filename, ok = widgets.QFileDialog.getOpenFileName(
             self,
             "Select a File", 
             ".\\saves\\", 
-            "4Peanuts (*.fpn)"
+            SAVE_FILE_FILTER
         )
-        if filename:
-            with open(filename, 'r') as f:
-                f.readline()
-                nextline = f.readline().strip('\n')
-                while nextline[0] != '$':
-                    self.add_new_category(nextline)
-                    nextline = f.readline().strip('\n')
-                nextline = f.readline().strip('\n')
-                while nextline[0] != '$':
-                    self.add_new_source(nextline)
-                    nextline = f.readline().strip('\n')
-                nextline = f.readline().strip('\n')
-                while nextline[0] != '$':
-                    cat, deal = nextline.split(':')
-                    deal = literal_eval(deal)
-                    invItemWidget.deals.update({cat: deal})
-                    nextline = f.readline().strip('\n')
-                nextline = f.readline().strip('\n')
-                while nextline != '':
-                    name, category, source, price, count = nextline.split(',')
-                    self.add_item(name = name, category = category, source = source, price = float(price), count = int(count), parent_window = self)
-                    nextline = f.readline().strip('\n')
-
-    def update_lifetime_stats(self, sales):
-        if not os.path.exists('./logs/lifetime-logs'):
-            open('./logs/lifetime-logs', 'x')
-        with open('./logs/lifetime-logs', 'r') as f:
-            data_lines = f.readlines()
-            if not data_lines:
-                item_tags, lifetime_sales = [], []
+        if not filename:
+            return
+        replace = False
+        if len(self.items) and self.station is None:
+            replace = self.ask_replace(os.path.basename(filename))
+            if replace is None:
+                return
+        first = None if self.station is not None else 0 if replace else len(self.items)
+        worker = Worker(self.read_inventory, filename, first, with_progress = True)
+        self.start_file_task('Opening ' + os.path.basename(filename), worker, lambda result: self.inventory_read(result, replace))
+
+    # Whether an opened file replaces the items already here (the autosave
+    # usually holds the same file) or is added to them; None to cancel
+
+    def ask_replace(self, name):
+        box = widgets.QMessageBox(self)
+        box.setWindowTitle("Open")
+        box.setText(f"Replace the {len(self.items)} items in the inventory with {name}, or add its items to them?")
+        replace_button = box.addButton("Replace", widgets.QMessageBox.ButtonRole.AcceptRole)
+        add_button = box.addButton("Add", widgets.QMessageBox.ButtonRole.ActionRole)
+        box.addButton(widgets.QMessageBox.StandardButton.Cancel)
+        box.setDefaultButton(replace_button)
+        box.exec()
+        if box.clickedButton() is replace_button:
+            return True
+        elif box.clickedButton() is add_button:
+            return False
+        return None
+
+    # Runs on the file thread: read the file, and unless it goes to a
+    # station, index its names for the rows from first on
+
+    def read_inventory(self, filename, first, progress):
+        saved = read_save(filename, progress)
+        index = None
+        if first is not None:
+            index = self.inventory.index_items(saved.items, first, progress)
+        return saved, index
+
+    # Time spent here, merging what was read, is what opening a file
+    # still costs the GUI thread
+
+    def inventory_read(self, result, replace = False):
+        saved, index = result
+        with perf.measure('open_from_file'):
+            if self.station is not None:
+                self.send_to_station(saved)
             else:
-                item_tags, lifetime_sales = [line.split('#')[0].strip() for line in data_lines], [line.split('#')[1].strip() for line in data_lines]
-            for sale in sales:
-                item_tag = '[' + sale['category'] + '] ' + sale['item']
-                if item_tag in item_tags:
-                    lifetime_sales[item_tags.index(item_tag)] = str(int(lifetime_sales[item_tags.index(item_tag)]) + 1)
-                else:
-                    item_tags.append(item_tag)
-                    lifetime_sales.append('1')
-        with open('./logs/lifetime-logs', 'w') as f:
-            for ind in range(len(item_tags)):
-                f.write(item_tags[ind] + ' #' + lifetime_sales[ind] + '\n')
-        return
-    
-    def update_daily_stats(self, sales, amount):
-        log_name = './logs/daily-log-' + str(datetime.now().date()) + '.txt'
-        with open(log_name, 'a+') as f:
-            sale_time = str(datetime.now().time()).split('.')[0]
-            f.write('$SALE: ' + str(amount) + ' ' + str(sale_time) + ' ' + str(len(sales)) + ' ITEMS \n')
-            for sale in sales:
-                f.write(sale['item'] + ';' + sale['category'] + '\n')
-        return
-    
+                self.load_inventory(saved, replace, index)
+
+    # A file opened at a station is added to the shared inventory, and
+    # its items come back with the server's update
+
+    def send_to_station(self, saved):
+        for source in sorted(self.inventory.merge_saved(saved)):
+            self.add_source_check(source)
+        self.station.add_items(saved.items, lambda rows: self.statusBar().showMessage(f'Added {len(rows)} items to the station', 10000))
+
+    # Add a parsed save file to the inventory in one batch, or with
+    # replace put its items in place of the current ones: categories
+    # and sources are registered together, and the table and source
+    # panel are repainted once at the end rather than per row.
+
+    def load_inventory(self, saved, replace = False, index = None):
+        new_sources = self.inventory.merge_saved(saved)
+        self.setUpdatesEnabled(False)
+        try:
+            for source in sorted(new_sources):
+                self.add_source_check(source)
+            if replace:
+                self.inventoryModel.replace_items(saved.items, index)
+                self.display_sell_price()
+            else:
+                self.inventoryModel.add_items(saved.items, index)
+            self.update_display()
+        finally:
+            self.setUpdatesEnabled(True)
+
+    def closeEvent(self, event):
+
+        # Commit the cell being edited so the autosave journal gets it
+
+        editor = self.itemTable.indexWidget(self.itemTable.currentIndex())
+        if editor is not None:
+            self.itemTable.commitData(editor)
+        if self.dashboard is not None:
+            self.dashboard.done(0)
+        self.file_pool.waitForDone()
+        self.disconnect_station()
+        self.inventory.close()
+        if perf.enabled:
+            perf.write_metrics()
+        super().closeEvent(event)
+
     def changeEvent(self, event):
         if event.type() == QEvent.Type.WindowStateChange:
             self.title_bar.window_state_changed(self.windowState())
@@ -930,9 +1424,28 @@ class MainWindow(widgets.QMainWindow):
         super().mouseReleaseEvent(event)
         event.accept()
 
+    def record_timings(self, on):
+        perf.enable(on)
+        if on:
+            self.metricsTimer.start()
+        else:
+            self.metricsTimer.stop()
+            perf.write_metrics()
+
+    def toggle_perf_overlay(self, on):
+        if on and not perf.enabled:
+            self.record_perf_action.setChecked(True)
+        self.perfOverlay.toggle(on)
+
     def open_data_dialog(self):
-        dlg = DataDialog(self)
+        dlg = import_charts().DataDialog(self)
         dlg.exec()
+
+    def open_live_dashboard(self):
+        if self.dashboard is None:
+            self.dashboard = import_charts().LiveDashboard(self)
+        self.dashboard.show()
+        self.dashboard.raise_()
         
 if __name__ == '__main__':
     app = widgets.QApplication(sys.argv)
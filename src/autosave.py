@@ -0,0 +1,260 @@
+#################################################
+#
+#   class EditJournal:
+#
+#   Autosave of an Inventory (see core.py), so
+#   stock, price and name changes survive a crash
+#   or power loss without anyone pressing Save.
+#
+#   The state lives on disk in two files:
+#
+#       autosave.fpnb          snapshot, a binary
+#                              save file
+#       autosave.fpnb.journal  one JSON line per
+#                              change since the
+#                              snapshot was written
+#
+#   Each change is appended to the journal and
+#   synced before the edit returns, so its cost
+#   does not depend on the size of the catalog.
+#   Every COMPACT_EVERY changes the inventory is
+#   written to a new snapshot, which replaces the
+#   old one atomically, and the journal is
+#   emptied.
+#
+#   With background = True, as the window and the
+#   server use it, the writing and syncing is
+#   done by a thread, like LifetimeStats does:
+#   an edit only queues its journal lines, and a
+#   due snapshot only queues a copy of the
+#   inventory (save_state() in core.py) taken at
+#   that point in the journal. A failed write is
+#   kept in error.
+#
+#   Journal lines hold the new value of whatever
+#   changed, never a difference, so replaying a
+#   line the snapshot already includes changes
+#   nothing. That makes a crash between writing
+#   the snapshot and emptying the journal safe.
+#   A torn last line is a change that was never
+#   recorded and is ignored, like in lifetime.py.
+#
+#       {"item": row, "fields": [name, category,
+#                      source, price, count, sku]}
+#       {"category": name}
+#       {"source": name}
+#       {"deal": category, "value": deal or null}
+#       {"clear": true}   every item removed
+
+import json
+import os
+import queue
+import threading
+
+from savefile import write_save
+
+AUTOSAVE_PATH = './saves/autosave.fpnb'
+COMPACT_EVERY = 500
+
+# Journal entries are also what the station server (server.py) sends
+# its clients, so applying one is shared
+
+def item_entries(inventory, rows):
+    return [{'item': row, 'fields': list(inventory.items[row].fields())} for row in rows]
+
+# Apply a journal entry to an inventory. An item entry for the row
+# after the last adds the item. Entries written before items had SKUs
+# leave the SKU as it is.
+
+def apply_entry(inventory, entry):
+    if 'item' in entry:
+        row = entry['item']
+        name, category, source, price, count, *sku = entry['fields']
+        if row == len(inventory.items):
+            inventory.add_item(inventory.new_item(name, category, source, price, count, *sku))
+        else:
+            inventory.rename(row, name)
+            inventory.set_category(row, category)
+            inventory.set_source(row, source)
+            inventory.set_price(row, price)
+            inventory.set_count(row, count)
+            if sku:
+                inventory.set_sku(row, sku[0])
+    elif 'category' in entry:
+        inventory.add_category(entry['category'])
+    elif 'source' in entry:
+        inventory.add_source(entry['source'])
+    elif 'deal' in entry:
+        deal = entry['value']
+        inventory.set_deal(entry['deal'], tuple(deal) if deal is not None else None)
+    elif entry.get('clear'):
+        inventory.clear_items()
+
+# Stations send the server only what they changed in a row, never the
+# whole row, so a stale copy of a field another station changed
+# meanwhile is not written back. Stock goes as the change in count,
+# which adds up with the sales and restocking done elsewhere:
+#
+#       {"item": row, "set": {field: value}, "stock": +n or -n}
+
+CHANGE_FIELDS = ['name', 'category', 'source', 'price', 'count', 'sku']
+COUNT_FIELD = CHANGE_FIELDS.index('count')
+
+# Entry for the fields of a row that differ, or None if none do
+
+def change_entry(row, old_fields, new_fields):
+    entry = {'item': row}
+    changed = {field: new for field, old, new in zip(CHANGE_FIELDS, old_fields, new_fields) if old != new and field != 'count'}
+    if changed:
+        entry['set'] = changed
+    if new_fields[COUNT_FIELD] != old_fields[COUNT_FIELD]:
+        entry['stock'] = new_fields[COUNT_FIELD] - old_fields[COUNT_FIELD]
+    return entry if len(entry) > 1 else None
+
+def apply_change(inventory, entry):
+    row = entry['item']
+    if not 0 <= row < len(inventory.items):
+        raise IndexError(f'no item at row {row}')
+    setters = {'name': inventory.rename, 'category': inventory.set_category, 'source': inventory.set_source,
+               'price': inventory.set_price, 'sku': inventory.set_sku}
+    changed = entry.get('set', {})
+    unknown = set(changed).difference(setters)
+    if unknown:
+        raise KeyError(', '.join(sorted(unknown)))
+    for field, value in changed.items():
+        setters[field](row, value)
+    if entry.get('stock'):
+        inventory.set_count(row, max(0, inventory.items[row].inv_count + int(entry['stock'])))
+
+class EditJournal:
+
+    def __init__(self, inventory, path = AUTOSAVE_PATH, compact_every = COMPACT_EVERY, background = False):
+        self.inventory = inventory
+        self.background = background
+        self.queue = None
+        self.error = None
+        self.path = path
+        self.journal_path = path + '.journal'
+        self.compact_every = compact_every
+        self.pending = 0
+        self.journal = None
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok = True)
+
+    # Restore the inventory from the snapshot and journal, returning
+    # whether there was anything to restore. The inventory must not
+    # have a journal attached yet, or replaying would record again.
+
+    def load(self):
+        restored = False
+        if os.path.exists(self.path):
+            self.inventory.open(self.path)
+            restored = True
+        if os.path.exists(self.journal_path):
+            good_length = 0
+            with open(self.journal_path, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break
+                    try:
+                        apply_entry(self.inventory, json.loads(line))
+                    except (ValueError, KeyError, IndexError):
+                        break
+                    good_length += len(line)
+                    self.pending += 1
+                    restored = True
+
+            # Drop a torn last line so new changes are not appended to it
+
+            if good_length < os.path.getsize(self.journal_path):
+                os.truncate(self.journal_path, good_length)
+        self.journal = open(self.journal_path, 'a')
+        if self.background:
+            self.queue = queue.Queue()
+            self.writer = threading.Thread(target = self.run, name = 'EditJournalWriter', daemon = True)
+            self.writer.start()
+        return restored
+
+    # Record changes, given as journal entries. The inventory already
+    # holds them, so when they would bring on a snapshot anyway, as
+    # opening a big save file does, only the snapshot is written.
+
+    def record(self, entries):
+        if not entries:
+            return
+        if self.compact_due(len(entries)):
+            return
+        self.submit(''.join(json.dumps(entry) + '\n' for entry in entries), None)
+        self.pending += len(entries)
+        if self.pending >= self.compact_every:
+            self.compact()
+
+    def items_changed(self, rows):
+        if not self.compact_due(len(rows)):
+            self.record(item_entries(self.inventory, rows))
+
+    def compact_due(self, changes):
+        if self.pending + changes < self.compact_every:
+            return False
+        self.compact()
+        return True
+
+    def compact(self):
+        self.submit(None, self.inventory.save_state())
+        self.pending = 0
+
+    # Write journal lines or a snapshot, given as save_state(), now or
+    # on the writer thread
+
+    def submit(self, lines, state):
+        if self.queue is not None:
+            self.queue.put((lines, state))
+        else:
+            self.write([(lines, state)])
+
+    # Write (lines, state) jobs, syncing once at the end and before
+    # every snapshot
+
+    def write(self, jobs):
+        for lines, state in jobs:
+            if lines is not None:
+                self.journal.write(lines)
+            if state is not None:
+                self.sync()
+                write_save(self.path, *state)
+                self.journal.close()
+                self.journal = open(self.journal_path, 'w')
+        self.sync()
+
+    def sync(self):
+        self.journal.flush()
+        os.fsync(self.journal.fileno())
+
+    def run(self):
+        running = True
+        while running:
+            jobs = [self.queue.get()]
+            while True:
+                try:
+                    jobs.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in jobs:
+                jobs = jobs[:jobs.index(None)]
+                running = False
+            try:
+                self.write(jobs)
+            except OSError as error:
+                self.error = error
+
+    def close(self):
+        if self.journal is None:
+            return
+        if self.queue is not None:
+            self.queue.put(None)
+            self.writer.join()
+            self.queue = None
+        if self.pending:
+            self.compact()
+        self.journal.close()
+        self.journal = None
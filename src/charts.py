@@ -0,0 +1,393 @@
+#################################################
+#
+#   Sales charts.
+#
+#   Everything that needs the analytics stack
+#   (pandas, matplotlib and seaborn) lives here,
+#   so 4peanuts.py can start without loading it.
+#   The main window imports this module the
+#   first time a chart is opened, or ahead of
+#   time on a background thread once the window
+#   is up.
+
+import threading
+
+import PyQt6.QtWidgets as widgets
+from PyQt6.QtCore import QDate, QThreadPool, QTimer
+
+import numpy as np
+import matplotlib.dates as mdates
+from matplotlib.backends.backend_qtagg import FigureCanvasQTAgg as FigureCanvas
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from matplotlib.ticker import MaxNLocator
+import seaborn as sns
+
+from workers import Worker
+from salesdata import SalesSummary
+from logcache import LogCache, load_date_range
+
+sns.set_theme()
+
+halfHourFmt = mdates.DateFormatter('%H:%M')
+halfHourLoc = mdates.MinuteLocator([0,30])
+
+#################################################
+#
+#   class SalesCharts:
+#
+#   The four sales charts. Their axes and
+#   artists are created once and updated in
+#   place, and a chart is only redrawn when its
+#   data changed.
+#
+#   update_charts() changes the figures and
+#   renders them into their Agg buffers, and is
+#   safe to call off the GUI thread: it holds
+#   chart_lock, which the canvases also take to
+#   draw, paint and resize. show_charts() must
+#   then be called on the GUI thread with its
+#   result to put the new images on screen.
+
+BAR_WIDTH = 0.02
+
+chart_lock = threading.RLock()
+
+class ChartCanvas(FigureCanvas):
+
+    def draw(self):
+        with chart_lock:
+            super().draw()
+
+    def paintEvent(self, event):
+        with chart_lock:
+            super().paintEvent(event)
+
+    def resizeEvent(self, event):
+        with chart_lock:
+            super().resizeEvent(event)
+
+class SalesCharts(widgets.QWidget):
+
+    def __init__(self, parent = None):
+        super().__init__(parent)
+
+        self.customers_over_time = ChartCanvas(Figure(figsize=(3, 3), dpi=80, tight_layout = True))
+        self.items_over_time = ChartCanvas(Figure(figsize=(3,3), dpi=80, tight_layout = True))
+        self.profit_over_time = ChartCanvas(Figure(figsize=(3, 3), dpi=80, tight_layout = True))
+        self.num_items_sold = ChartCanvas(Figure(figsize=(3, 3), dpi=80, tight_layout = True))
+
+        # Customers over time
+
+        self.cot_axes = self.customers_over_time.figure.add_subplot()
+        self.cot_axes.yaxis.set_major_locator(MaxNLocator(integer=True))
+        self.cot_axes.set_title('Customers Over Time')
+        self.cot_axes.set_xlabel('Time', labelpad=15)
+        self.cot_axes.set_ylabel('No. Customers', labelpad=15)
+
+        # Items sold over time
+
+        self.iot_axes = self.items_over_time.figure.add_subplot()
+        self.iot_axes.yaxis.set_major_locator(MaxNLocator(integer=True))
+        self.iot_axes.set_title('Items Sold Over Time')
+        self.iot_axes.set_xlabel('Time', labelpad=15)
+        self.iot_axes.set_ylabel('No. Items Sold', labelpad=15)
+
+        # Profit over time
+
+        self.pot_axes = self.profit_over_time.figure.add_subplot()
+        self.pot_axes.yaxis.set_major_formatter('${x:3.2f}')
+        self.pot_axes.yaxis.set_major_locator(MaxNLocator(integer=True))
+        self.pot_axes.set_title('Cumulative Profit Over Time')
+        self.pot_axes.set_xlabel('Time', labelpad=15)
+        self.pot_axes.set_ylabel('Total Profit', labelpad=15)
+        self.pot_line, = self.pot_axes.plot([], [], color='gold')
+
+        # Number of each item sold
+
+        self.itemsold_axes = self.num_items_sold.figure.add_subplot()
+        self.itemsold_axes.xaxis.set_major_locator(MaxNLocator(integer=True))
+        self.itemsold_axes.tick_params(axis='y', which='major', pad=20)
+        self.itemsold_axes.set_title('Sales by Item')
+        self.itemsold_axes.set_xlabel('No. Sold', labelpad=15)
+        self.itemsold_axes.set_ylabel('Item and Category', labelpad=15)
+
+        for axes in (self.cot_axes, self.iot_axes, self.pot_axes):
+            axes.xaxis_date()
+            axes.figure.autofmt_xdate(rotation=70, ha='center')
+            self.set_time_axis(axes, False)
+
+        self.bars = {}
+        self.shown = {}
+        self.multi_day = False
+
+        chart_layout = widgets.QGridLayout()
+        chart_layout.setContentsMargins(0, 0, 0, 0)
+        chart_layout.addWidget(self.customers_over_time, 0, 0)
+        chart_layout.addWidget(self.items_over_time, 0, 1)
+        chart_layout.addWidget(self.profit_over_time, 1, 0)
+        chart_layout.addWidget(self.num_items_sold, 1, 1)
+        self.setLayout(chart_layout)
+
+    # Several days are labelled by date and time, one day by time alone
+
+    def set_time_axis(self, axes, multi_day):
+        if multi_day:
+            locator = mdates.AutoDateLocator()
+            axes.xaxis.set_major_locator(locator)
+            axes.xaxis.set_major_formatter(mdates.ConciseDateFormatter(locator))
+        else:
+            axes.xaxis.set_major_formatter(halfHourFmt)
+            axes.xaxis.set_major_locator(halfHourLoc)
+
+    # Update the bars of a chart in place, or replace them if their number changed
+
+    def set_bars(self, name, axes, positions, lengths, color, horizontal = False):
+        bars = self.bars.get(name)
+        if bars is not None and len(bars) == len(positions):
+            for bar, position, length in zip(bars, positions, lengths):
+                if horizontal:
+                    bar.set_width(length)
+                else:
+                    bar.set_x(position - BAR_WIDTH / 2)
+                    bar.set_height(length)
+        else:
+            if bars is not None:
+                bars.remove()
+            if horizontal:
+                bars = axes.barh(positions, lengths, color=color)
+            else:
+                bars = axes.bar(positions, lengths, width=BAR_WIDTH, color=color)
+            self.bars[name] = bars
+        axes.relim()
+        axes.autoscale_view()
+
+    # Remember the data drawn by a chart, returning whether it changed
+
+    def changed(self, name, *data):
+        previous = self.shown.get(name)
+        if previous is not None and all(np.array_equal(old, new) for old, new in zip(previous, data)):
+            return False
+        self.shown[name] = data
+        return True
+
+    def update_charts(self, summary):
+        times = mdates.date2num(summary.bucket_times())
+        multi_day = len(times) > 0 and int(times[0]) != int(times[-1])
+        changed_canvases = []
+        with chart_lock:
+            if multi_day != self.multi_day:
+                self.multi_day = multi_day
+                for axes in (self.cot_axes, self.iot_axes, self.pot_axes):
+                    self.set_time_axis(axes, multi_day)
+                self.shown.clear()
+
+            cot_y = summary.customers()
+            if self.changed('customers', times, cot_y):
+                self.set_bars('customers', self.cot_axes, times, cot_y, 'mediumturquoise')
+                changed_canvases.append(self.customers_over_time)
+
+            iot_y = summary.items()
+            if self.changed('items', times, iot_y):
+                self.set_bars('items', self.iot_axes, times, iot_y, 'mediumspringgreen')
+                changed_canvases.append(self.items_over_time)
+
+            pot_y = summary.cumulative_profit()
+            if self.changed('profit', times, pot_y):
+                self.pot_line.set_data(times, pot_y)
+                self.pot_axes.relim()
+                self.pot_axes.autoscale_view()
+                changed_canvases.append(self.profit_over_time)
+
+            itemsold_x = summary.item_titles()
+            itemsold_y = summary.item_counts()
+            if self.changed('itemsold', np.array(itemsold_x, dtype=object), itemsold_y):
+                positions = np.arange(len(itemsold_x))
+                self.set_bars('itemsold', self.itemsold_axes, positions, itemsold_y, 'salmon', horizontal = True)
+                self.itemsold_axes.set_yticks(positions, itemsold_x, ha='center')
+                changed_canvases.append(self.num_items_sold)
+
+            for canvas in changed_canvases:
+                FigureCanvasAgg.draw(canvas)
+        return changed_canvases
+
+    def show_charts(self, changed_canvases):
+        for canvas in changed_canvases:
+            canvas.update()
+
+class DataDialog(widgets.QDialog):
+    def __init__(self, parent = None):
+        super().__init__(parent)
+
+        self.setWindowTitle("Chart Sales Data")
+        self.resize(900,700)
+
+        # Get data
+
+        self.log_cache = LogCache()
+
+        # Overall window layout
+
+        data_window_layout = widgets.QVBoxLayout()
+
+        # Label for date
+
+        self.data_date_label = widgets.QLabel("Select a log file to chart.")
+        self.data_date_label.setStyleSheet("font-size: 20px; qproperty-alignment: AlignCenter; font-weight: bold")
+        #self.data_date_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.data_date_label.setFixedHeight(50)
+        data_window_layout.addWidget(self.data_date_label)
+
+        # Charts, loaded and rendered one log at a time on a worker thread
+
+        self.charts = SalesCharts()
+        data_window_layout.addWidget(self.charts)
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(1)
+
+        # Controls to chart a range of days, or open data from file
+
+        controls = widgets.QWidget()
+        controls_layout = widgets.QHBoxLayout()
+        self.range_start = widgets.QDateEdit(QDate.currentDate().addDays(-6))
+        self.range_start.setCalendarPopup(True)
+        self.range_end = widgets.QDateEdit(QDate.currentDate())
+        self.range_end.setCalendarPopup(True)
+        chart_range_button = widgets.QPushButton("Chart Range")
+        chart_range_button.setFixedWidth(200)
+        chart_range_button.clicked.connect(self.read_range_data)
+        controls_layout.addWidget(widgets.QLabel("From"))
+        controls_layout.addWidget(self.range_start)
+        controls_layout.addWidget(widgets.QLabel("to"))
+        controls_layout.addWidget(self.range_end)
+        controls_layout.addWidget(chart_range_button)
+        controls_layout.addSpacerItem(widgets.QSpacerItem(1,1,widgets.QSizePolicy.Policy.Expanding,widgets.QSizePolicy.Policy.Minimum))
+
+        open_data_button = widgets.QPushButton("Open Data Log")
+        open_data_button.setFixedWidth(200)
+        open_data_button.clicked.connect(self.read_file_data)
+        controls_layout.addWidget(open_data_button)
+        controls.setLayout(controls_layout)
+        data_window_layout.addWidget(controls)
+
+        # Set overall window layout
+
+        self.setLayout(data_window_layout)
+
+    def read_file_data(self):
+        filename, ok = widgets.QFileDialog.getOpenFileName(
+            self,
+            "Select a File", 
+            ".\\logs\\", 
+            "Text File (*.txt)"
+        )
+        if filename:
+            self.load_charts(lambda: self.log_cache.load(filename), "for " + filename[-14:-4])
+
+    def read_range_data(self):
+        start = self.range_start.date().toPyDate()
+        end = self.range_end.date().toPyDate()
+        self.load_charts(lambda: load_date_range(start, end, self.log_cache), "from " + str(start) + " to " + str(end))
+
+    # Load a summary and render it off the GUI thread
+
+    def load_charts(self, load, label):
+        self.data_date_label.setText("Loading " + label + "...")
+        worker = Worker(self.render_summary, load)
+        worker.signals.finished.connect(lambda result: self.show_summary(result, label))
+        worker.signals.error.connect(lambda message: self.data_date_label.setText("Could not chart " + label + ": " + message))
+        self.thread_pool.start(worker)
+
+    def render_summary(self, load):
+        summary = load()
+        if summary.buckets.empty:
+            return None
+        return self.charts.update_charts(summary)
+
+    def show_summary(self, changed_canvases, label):
+        if changed_canvases is None:
+            self.data_date_label.setText("No sales logs " + label)
+            return
+        self.data_date_label.setText("Sales data " + label)
+        self.charts.show_charts(changed_canvases)
+
+    def done(self, result):
+        self.thread_pool.waitForDone()
+        super().done(result)
+
+#################################################
+#
+#   class LiveDashboard:
+#
+#   Charts of today's sales as they happen. It
+#   listens to MainWindow.saleCompleted and
+#   redraws from the window's in-memory
+#   LiveSales at most once per
+#   LIVE_REDRAW_MS, and only if a sale came in.
+
+LIVE_REDRAW_MS = 1000
+
+class LiveDashboard(widgets.QDialog):
+    def __init__(self, parent):
+        super().__init__(parent)
+
+        self.setWindowTitle("Live Sales Dashboard")
+        self.resize(900,700)
+        self.live_sales = parent.live_sales
+        self.dirty = True
+        self.rendering = False
+
+        dashboard_layout = widgets.QVBoxLayout()
+        self.status_label = widgets.QLabel("No sales yet today.")
+        self.status_label.setStyleSheet("font-size: 20px; qproperty-alignment: AlignCenter; font-weight: bold")
+        self.status_label.setFixedHeight(50)
+        dashboard_layout.addWidget(self.status_label)
+        self.charts = SalesCharts()
+        dashboard_layout.addWidget(self.charts)
+        self.setLayout(dashboard_layout)
+
+        self.thread_pool = QThreadPool(self)
+        self.thread_pool.setMaxThreadCount(1)
+        self.redraw_timer = QTimer(self)
+        self.redraw_timer.setInterval(LIVE_REDRAW_MS)
+        self.redraw_timer.timeout.connect(self.redraw)
+        parent.saleCompleted.connect(self.sale_completed)
+
+    def sale_completed(self, sale):
+        self.dirty = True
+
+    def showEvent(self, event):
+        self.redraw_timer.start()
+        self.redraw()
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self.redraw_timer.stop()
+        super().hideEvent(event)
+
+    def redraw(self):
+        if not self.dirty or self.rendering or not self.live_sales.buckets:
+            return
+        self.dirty = False
+        self.rendering = True
+        summary = SalesSummary.from_dict(self.live_sales.to_dict())
+        worker = Worker(self.charts.update_charts, summary)
+        worker.signals.finished.connect(self.show_charts)
+        worker.signals.error.connect(self.render_failed)
+        self.thread_pool.start(worker)
+
+    def show_charts(self, changed_canvases):
+        self.rendering = False
+        customers = sum(customers for customers, items, profit in self.live_sales.buckets.values())
+        profit = sum(profit for customers, items, profit in self.live_sales.buckets.values())
+        self.status_label.setText(f"{customers} customers, ${profit:.2f} today")
+        self.charts.show_charts(changed_canvases)
+
+    def render_failed(self, message):
+        self.rendering = False
+        self.status_label.setText("Could not chart sales: " + message)
+
+    def done(self, result):
+        self.redraw_timer.stop()
+        self.thread_pool.waitForDone()
+        super().done(result)
@@ -0,0 +1,172 @@
+#################################################
+#
+#   Command line batch interface.
+#
+#   Runs the headless core (core.py) without a
+#   window, for processing at the end of the day
+#   or on a machine with no display:
+#
+#       apply-sales SAVE SALES.csv
+#           Ring up the sales in a CSV file and
+#           record them to the lifetime stats and
+#           daily logs like the Sell button does.
+#           Columns are name and quantity, with
+#           optional category (to tell apart items
+#           with the same name), sku (to find the
+#           item by SKU instead), sale (lines with
+#           the same sale id are one customer) and
+#           time (ISO date and time, or a time of
+#           day today).
+#
+#       reprice SAVE --percent P | --price X
+#           Change prices by a percentage or set
+#           them, optionally only for one
+#           --category or --source.
+#
+#       export-stats SAVE OUTPUT.csv
+#           Write every item with its stock and
+#           lifetime number sold.
+#
+#   Changed saves are written back over SAVE
+#   unless --output is given. Run from the
+#   4Peanuts folder, as the app is, so the logs
+#   go to the same place.
+
+import argparse
+import csv
+import sys
+from datetime import datetime, date, time
+
+import numpy as np
+
+from core import Inventory
+from lifetime import LifetimeStats, LIFETIME_LOG, item_tag
+from dailylog import DailyLogWriter, LOG_DIR, FLUSH_ON_IDLE
+
+def parse_time(text):
+    try:
+        return datetime.fromisoformat(text)
+    except ValueError:
+        return datetime.combine(date.today(), time.fromisoformat(text))
+
+# Group the lines of a sales CSV into sales of [(row, quantity)] with their time
+
+def read_sales(inventory, filename):
+    sales = []
+    errors = []
+    last_sale_id = None
+    with open(filename, newline = '') as f:
+        for line_number, line in enumerate(csv.DictReader(f), 2):
+            if line.get('sku'):
+                row = inventory.row_of_sku(line['sku'])
+                if row is None:
+                    errors.append(f'{filename}:{line_number}: no item with SKU {line["sku"]!r}')
+                    continue
+                rows = [row]
+            else:
+                name = line['name']
+                rows = inventory.rows_named(name)
+                if line.get('category'):
+                    rows = [row for row in rows if inventory.items[row].product_category == line['category']]
+                if not rows:
+                    errors.append(f'{filename}:{line_number}: no item named {name!r}')
+                    continue
+            try:
+                quantity = int(line['quantity'])
+                when = parse_time(line['time']) if line.get('time') else None
+            except ValueError as error:
+                errors.append(f'{filename}:{line_number}: {error}')
+                continue
+            sale_id = line.get('sale') or None
+            if sale_id is None or sale_id != last_sale_id:
+                sales.append((when, []))
+            sales[-1][1].append((rows[0], quantity))
+            last_sale_id = sale_id
+    return sales, errors
+
+def apply_sales(args):
+    inventory = Inventory()
+    inventory.open(args.save)
+    sales, errors = read_sales(inventory, args.sales)
+    if errors:
+        print('\n'.join(errors), file = sys.stderr)
+        print('No sales applied.', file = sys.stderr)
+        return 1
+    if not args.no_logs:
+        inventory.lifetime_stats = LifetimeStats(args.lifetime)
+        inventory.daily_log = DailyLogWriter(policy = FLUSH_ON_IDLE, log_dir = args.log_dir)
+    try:
+        for when, lines in sales:
+            for row, quantity in lines:
+                item = inventory.items[row]
+                wanted = item.sell_count + quantity
+                inventory.set_sell_count(row, wanted)
+                if item.sell_count < wanted:
+                    print(f'warning: only {item.inv_count} of {item.product_name!r} in stock, selling {item.sell_count}', file = sys.stderr)
+            inventory.complete_sale(when)
+    finally:
+        inventory.close()
+    inventory.save(args.output or args.save)
+    print(f'{len(sales)} sales, ${inventory.total_profit:.2f}')
+    return 0
+
+def reprice(args):
+    inventory = Inventory()
+    inventory.open(args.save)
+    rows = np.ones(len(inventory.items), dtype = bool)
+    if args.category is not None:
+        rows &= inventory.items.category_mask([args.category])
+    if args.source is not None:
+        rows &= inventory.items.source_mask([args.source])
+    changed = inventory.reprice(rows, percent = args.percent, price = args.price)
+    inventory.save(args.output or args.save)
+    print(f'{changed} items repriced')
+    return 0
+
+def export_stats(args):
+    inventory = Inventory()
+    inventory.open(args.save)
+    lifetime_stats = LifetimeStats(args.lifetime, read_only = True)
+    with open(args.output, 'w', newline = '') as f:
+        writer = csv.writer(f)
+        writer.writerow(['name', 'category', 'source', 'price', 'in_stock', 'lifetime_sold'])
+        for item in inventory.items:
+            sold = lifetime_stats.counts.get(item_tag(item.product_category, item.product_name), 0)
+            writer.writerow([item.product_name, item.product_category, item.product_source, item.price, item.inv_count, sold])
+    print(f'{len(inventory.items)} items written to {args.output}, stock worth ${inventory.stock_value():.2f}')
+    return 0
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(prog = 'cli.py', description = '4Peanuts batch operations')
+    commands = parser.add_subparsers(dest = 'command', required = True)
+
+    apply_parser = commands.add_parser('apply-sales', help = 'ring up the sales in a CSV file')
+    apply_parser.add_argument('save', help = '.fpn or .fpnb save file')
+    apply_parser.add_argument('sales', help = 'CSV with name (or sku) and quantity columns')
+    apply_parser.add_argument('--output', help = 'save here instead of over SAVE')
+    apply_parser.add_argument('--no-logs', action = 'store_true', help = 'do not record to the lifetime stats and daily logs')
+    apply_parser.add_argument('--log-dir', default = LOG_DIR)
+    apply_parser.add_argument('--lifetime', default = LIFETIME_LOG)
+    apply_parser.set_defaults(run = apply_sales)
+
+    reprice_parser = commands.add_parser('reprice', help = 'change item prices')
+    reprice_parser.add_argument('save', help = '.fpn or .fpnb save file')
+    change = reprice_parser.add_mutually_exclusive_group(required = True)
+    change.add_argument('--percent', type = float, help = 'raise (or with a negative number, lower) prices by this percentage')
+    change.add_argument('--price', type = float, help = 'set prices to this')
+    reprice_parser.add_argument('--category')
+    reprice_parser.add_argument('--source')
+    reprice_parser.add_argument('--output', help = 'save here instead of over SAVE')
+    reprice_parser.set_defaults(run = reprice)
+
+    export_parser = commands.add_parser('export-stats', help = 'write stock and lifetime sales per item to CSV')
+    export_parser.add_argument('save', help = '.fpn or .fpnb save file')
+    export_parser.add_argument('output', help = 'CSV file to write')
+    export_parser.add_argument('--lifetime', default = LIFETIME_LOG)
+    export_parser.set_defaults(run = export_stats)
+
+    args = parser.parse_args(argv)
+    return args.run(args)
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,411 @@
+#################################################
+#
+#   Headless inventory core.
+#
+#   Everything the register does that does not
+#   need a screen: the items, the category and
+#   source lists, the deal table, the cart,
+#   completing sales with their stats and logs,
+#   and saving and loading. Nothing here imports
+#   Qt, so it runs the same under the window in
+#   4peanuts.py and the command line in cli.py.
+#
+#   Items are addressed by row, their position
+#   in Inventory.items, an ItemStore that holds
+#   them as NumPy columns. Changes go through the
+#   Inventory so the search index, the SKU index,
+#   the cart and the autosave journal stay up to
+#   date.
+
+from collections import namedtuple
+from datetime import datetime
+import bisect
+
+import numpy as np
+
+import perf
+import pricing
+from search import SearchIndex
+from itemstore import ItemStore
+from lifetime import item_tag
+from dailylog import LiveSales
+from savefile import read_save, write_save
+
+#################################################
+#
+#   class Item:
+#
+#   A product to add: its name, category,
+#   source, price, count and SKU (the code on its
+#   barcode, '' if it has none). Items added to
+#   an Inventory live in its ItemStore (see
+#   itemstore.py), which hands out ItemRow views
+#   of them; any (name, category, source, price,
+#   count) tuple, with or without a SKU, can be
+#   added the same way.
+
+Item = namedtuple('Item', ['name', 'category', 'source', 'price', 'count', 'sku'], defaults = ['New Product', '-', '-', 0.0, 0, ''])
+
+#################################################
+#
+#   class NameList:
+#
+#   Sorted list of category or source names with
+#   each name's position kept in a dict, so
+#   looking one up does not scan the list.
+
+class NameList:
+
+    def __init__(self, names = ()):
+        self.names = sorted(names)
+        self.rows = {name: row for row, name in enumerate(self.names)}
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.rows
+
+    def __getitem__(self, row):
+        return self.names[row]
+
+    def row_of(self, name):
+        return self.rows.get(name, -1)
+
+    # Row a new name will be inserted at
+
+    def position(self, name):
+        return bisect.bisect(self.names, name)
+
+    def add(self, name):
+        if name in self.rows:
+            return False
+        self.insert(self.position(name), [name])
+        return True
+
+    # Insert new names that all sort at row
+
+    def insert(self, row, names):
+        self.names[row:row] = names
+        for moved in range(row, len(self.names)):
+            self.rows[self.names[moved]] = moved
+
+    # Add many names with a single sort, returning the ones that were new
+
+    def add_many(self, names):
+        new_names = set(names).difference(self.rows, [''])
+        if new_names:
+            self.names = sorted(self.names + list(new_names))
+            self.rows = {name: row for row, name in enumerate(self.names)}
+        return new_names
+
+#################################################
+#
+#   class Inventory:
+#
+#   The items for sale and everything needed to
+#   ring them up. Completed sales are recorded
+#   to the lifetime stats and the daily log when
+#   those are given, and always to live_sales.
+#
+#   The window passes its own list models as
+#   categories and sources; anything with the
+#   NameList methods will do.
+#
+#   With a journal attached (see autosave.py),
+#   every change to the items, categories,
+#   sources and deals is recorded as it happens.
+#
+#   sku_rows maps each SKU to its row, so a scan
+#   finds its item without a search. A SKU names
+#   one item: set_sku() refuses one that is
+#   taken, and when added items repeat a SKU only
+#   the first is found by it.
+
+class Inventory:
+
+    def __init__(self, categories = None, sources = None, lifetime_stats = None, daily_log = None):
+        self.items = ItemStore()
+        self.categories = categories if categories is not None else NameList(['-'])
+        self.sources = sources if sources is not None else NameList(['-'])
+        self.deals = {'-' : None}
+        self.cart = pricing.Cart(self.deals)
+        self.search_index = SearchIndex()
+        self.sku_rows = dict()
+        self.revision = 0
+        self.lifetime_stats = lifetime_stats
+        self.daily_log = daily_log
+        self.live_sales = LiveSales()
+        self.total_profit = 0.0
+        self.journal = None
+
+    # Categories, sources and deals
+
+    def add_category(self, name):
+        if name == '' or not self.categories.add(name):
+            return False
+        self.deals.update({name : None})
+        self.record([{'category': name}])
+        return True
+
+    def add_source(self, name):
+        if name == '' or not self.sources.add(name):
+            return False
+        self.record([{'source': name}])
+        return True
+
+    def add_categories(self, names):
+        new_names = self.categories.add_many(names)
+        for name in new_names:
+            self.deals.update({name : None})
+        self.record([{'category': name} for name in new_names])
+        return new_names
+
+    def add_sources(self, names):
+        new_names = self.sources.add_many(names)
+        self.record([{'source': name} for name in new_names])
+        return new_names
+
+    def set_deal(self, category, deal):
+        self.deals.update({category : deal})
+        self.cart.invalidate(category)
+        self.record([{'deal': category, 'value': deal}])
+
+    # Items
+
+    def new_item(self, name = 'New Product', category = '-', source = '-', price = 0.0, count = 0, sku = ''):
+        return Item(name, category, source, price, count, sku)
+
+    def add_item(self, item):
+        return self.add_items([item])
+
+    # Append items, returning the row of the first. index is their names
+    # indexed ahead by index_items(), used if they still go at its row.
+
+    def add_items(self, items, index = None):
+        first = len(self.items)
+        self.items.extend(items)
+        if index is not None and index.first == first:
+            self.search_index.merge(index)
+        else:
+            for row, name in enumerate(self.items.names[first:], first):
+                self.search_index.add(row, name)
+        for row, sku in enumerate(self.items.skus[first:], first):
+            if sku:
+                self.sku_rows.setdefault(sku, row)
+        self.items_changed(range(first, len(self.items)))
+        return first
+
+    # Index the names of items to be added at row first. Indexing is
+    # most of what adding many items costs, and this touches nothing of
+    # the inventory, so it can run on another thread while the window
+    # carries on.
+
+    def index_items(self, items, first, progress = None):
+        index = SearchIndex(first)
+        index.add_many(items.names if isinstance(items, ItemStore) else [item[0] for item in items], progress)
+        return index
+
+    def rename(self, row, name):
+        self.items.set_name(row, name)
+        self.search_index.rename(row, name)
+        self.items_changed([row])
+
+    # Give an item a SKU, or take it away with ''. Returns False, changing
+    # nothing, if another item has the SKU.
+
+    def set_sku(self, row, sku):
+        if sku and self.sku_rows.get(sku, row) != row:
+            return False
+        old_sku = self.items.skus[row]
+        if self.sku_rows.get(old_sku) == row:
+            del self.sku_rows[old_sku]
+        if sku:
+            self.sku_rows[sku] = row
+        self.items.set_sku(row, sku)
+        self.items_changed([row])
+        return True
+
+    def row_of_sku(self, sku):
+        return self.sku_rows.get(sku)
+
+    def set_category(self, row, category):
+        self.items.set_category(row, category)
+        self.update_cart_line(row)
+        self.items_changed([row])
+
+    def set_source(self, row, source):
+        self.items.set_source(row, source)
+        self.items_changed([row])
+
+    def set_price(self, row, price):
+        self.items.set_price(row, price)
+        self.update_cart_line(row)
+        self.items_changed([row])
+
+    # Set the stock count, returning whether that lowered the sell count
+
+    def set_count(self, row, count):
+        lowered = self.items.set_count(row, count)
+        self.items_changed([row])
+        if lowered:
+            self.update_cart_line(row)
+        return lowered
+
+    def set_sell_count(self, row, count):
+        self.items.set_sell_count(row, count)
+        self.update_cart_line(row)
+
+    # Put one more of the item with this SKU in the cart, as a barcode
+    # scan does. Returns its row, or None if no item has the SKU; the
+    # sell count stops at the stock.
+
+    @perf.timed('scan')
+    def scan(self, sku):
+        row = self.sku_rows.get(sku)
+        if row is not None:
+            self.set_sell_count(row, int(self.items.sell_column[row]) + 1)
+        return row
+
+    # Change the price of many rows at once, given as a bool array or
+    # row numbers: by a percentage, or to a price
+
+    def reprice(self, rows, percent = None, price = None):
+        prices = self.items.prices
+        if price is not None:
+            prices[rows] = price
+        else:
+            prices[rows] = np.round(prices[rows] * (1 + percent / 100), 2)
+        changed = np.flatnonzero(rows) if getattr(rows, 'dtype', None) == bool else np.asarray(rows)
+        changed = changed.tolist()
+        for row in list(self.cart.lines):
+            self.update_cart_line(row)
+        self.items_changed(changed)
+        return len(changed)
+
+    def stock_value(self):
+        return self.items.stock_value()
+
+    # Remove every item, as when a station takes the server's inventory
+    # or a file is opened in place of the current one
+
+    def clear_items(self):
+        self.items.clear()
+        self.search_index = SearchIndex()
+        self.sku_rows.clear()
+        self.revision += 1
+        self.cart.clear()
+        self.record([{'clear': True}])
+
+    def rows_named(self, name):
+        matches = self.search_index.search(name)
+        rows = range(len(self.items)) if matches is None else sorted(matches)
+        return [row for row in rows if self.items.names[row] == name]
+
+    # Selling
+
+    def update_cart_line(self, row):
+        item = self.items[row]
+        self.cart.set_line(row, item.product_category, item.price, item.sell_count)
+
+    def cart_total(self):
+        return self.cart.total()
+
+    # Sell everything in the cart. Returns the rows sold from and the
+    # sale as (time, [(item, category, quantity)], amount).
+
+    @perf.timed('complete_sale')
+    def complete_sale(self, when = None):
+        when = when or datetime.now()
+        amount = self.cart.total()
+        sold_rows = list(self.cart.lines.keys())
+        lines = []
+        for row in sold_rows:
+            item = self.items[row]
+            lines.append((item.product_name, item.product_category, item.sell_count))
+        sold = np.array(sold_rows, dtype = np.intp)
+        self.items.counts[sold] -= self.items.sell_counts[sold]
+        self.items.sell_counts[sold] = 0
+        self.cart.clear()
+        self.items_changed(sold_rows)
+        self.record_sale(when, lines, amount)
+        return sold_rows, (when, lines, amount)
+
+    def record_sale(self, when, lines, amount):
+        self.total_profit += amount
+        self.update_lifetime_stats(lines)
+        self.update_daily_stats(lines, amount, when)
+        self.live_sales.add_sale(when, lines, amount)
+
+    # Stats are given as (item, category, quantity) lines
+
+    @perf.timed('update_lifetime_stats')
+    def update_lifetime_stats(self, lines):
+        if self.lifetime_stats is None:
+            return
+        sold = dict()
+        for item, category, quantity in lines:
+            tag = item_tag(category, item)
+            sold[tag] = sold.get(tag, 0) + quantity
+        self.lifetime_stats.record(sold)
+
+    @perf.timed('update_daily_stats')
+    def update_daily_stats(self, lines, amount, when = None):
+        if self.daily_log is not None:
+            self.daily_log.log_sale(lines, amount, when)
+
+    # Autosave
+
+    def attach_journal(self, journal):
+        self.journal = journal
+
+    def record(self, entries):
+        if self.journal is not None:
+            self.journal.record(entries)
+
+    # Every change to the items goes through here, so revision tells
+    # anything derived from them (see filters.py) when it is stale
+
+    def items_changed(self, rows):
+        self.revision += 1
+        if self.journal is not None:
+            self.journal.items_changed(rows)
+
+    # Saving and loading
+
+    def save(self, filename, progress = None):
+        write_save(filename, *self.save_state(), progress)
+
+    # Copies of everything a save holds, as write_save() takes them, for
+    # writing on another thread while the inventory keeps changing
+
+    def save_state(self):
+        return list(self.categories), list(self.sources), dict(self.deals), self.items.copy()
+
+    # Register the categories, sources and deals of a parsed save file,
+    # returning the sources that were new. Its items are added
+    # separately, so the window can add them to its table in one batch.
+
+    def merge_saved(self, saved):
+        self.add_categories(saved.categories)
+        self.deals.update(saved.deals)
+        self.cart.invalidate()
+        self.record([{'deal': category, 'value': deal} for category, deal in saved.deals.items()])
+        return self.add_sources(saved.sources)
+
+    def open(self, filename):
+        saved = read_save(filename)
+        self.merge_saved(saved)
+        self.add_items(saved.items)
+
+    def close(self):
+        if self.journal is not None:
+            self.journal.close()
+            self.journal = None
+        if self.lifetime_stats is not None:
+            self.lifetime_stats.close()
+        if self.daily_log is not None:
+            self.daily_log.close()
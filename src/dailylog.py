@@ -0,0 +1,262 @@
+#################################################
+#
+#   class DailyLogWriter:
+#
+#   Background thread that appends completed
+#   sales to the daily log, so the Sell button
+#   never waits on the disk.
+#
+#   Sales are queued with the time they happened
+#   and written in batches. When the written
+#   lines reach the disk depends on the flush
+#   policy:
+#
+#       FLUSH_PER_SALE  flush and sync after
+#                       every sale
+#       FLUSH_INTERVAL  flush at most every
+#                       interval_ms milliseconds
+#       FLUSH_ON_IDLE   flush whenever the queue
+#                       runs empty
+#
+#   close() writes out everything still queued
+#   before returning.
+#
+#   Logs are written in the compact format 2,
+#   with one line per item sold in a sale:
+#
+#       $FORMAT 2
+#       @ITEM 0 Sonic             item id 0
+#       @CAT 0 Print              category id 0
+#       $SALE: 30.0 16:14:05 10 ITEMS 
+#       =0 0 10                   10 of item 0
+#                                 in category 0
+#
+#   Ids are numbered per file and defined the
+#   first time they are used. read_daily_log()
+#   also accepts the older formats, which write
+#   one "item;category" line per unit after each
+#   $SALE line, or one "item;category;price;time"
+#   line per unit with no $SALE lines at all.
+
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+LOG_DIR = './logs'
+
+FLUSH_PER_SALE = 'sale'
+FLUSH_INTERVAL = 'interval'
+FLUSH_ON_IDLE = 'idle'
+
+LOG_FORMAT = 2
+
+def daily_log_name(date, log_dir = LOG_DIR):
+    return os.path.join(log_dir, 'daily-log-' + str(date) + '.txt')
+
+class DailyLogWriter(threading.Thread):
+
+    def __init__(self, policy = FLUSH_ON_IDLE, interval_ms = 500, log_dir = LOG_DIR):
+        super().__init__(name = 'DailyLogWriter', daemon = True)
+        self.policy = policy
+        self.interval = interval_ms / 1000
+        self.log_dir = log_dir
+        self.queue = queue.Queue()
+        self.file = None
+        self.file_name = None
+        self.item_ids = dict()
+        self.category_ids = dict()
+        self.last_flush = time.monotonic()
+        self.dirty = False
+        self.error = None
+        self.start()
+
+    # Queue a sale, given as a list of (item, category, quantity) lines
+
+    def log_sale(self, sales, amount, when = None):
+        self.queue.put((when or datetime.now(), sales, amount))
+
+    def close(self):
+        self.queue.put(None)
+        self.join()
+
+    def run(self):
+        running = True
+        while running:
+            timeout = self.interval if self.policy == FLUSH_INTERVAL and self.dirty else None
+            try:
+                batch = [self.queue.get(timeout = timeout)]
+            except queue.Empty:
+                batch = []
+            while True:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in batch:
+                batch = batch[:batch.index(None)]
+                running = False
+            try:
+                for record in batch:
+                    self.write_record(*record)
+                    if self.policy == FLUSH_PER_SALE:
+                        self.flush(sync = True)
+                if not running or self.policy == FLUSH_ON_IDLE:
+                    self.flush()
+                elif self.policy == FLUSH_INTERVAL and time.monotonic() - self.last_flush >= self.interval:
+                    self.flush()
+            except OSError as error:
+                self.error = error
+        if self.file is not None:
+            self.file.close()
+
+    def open_log(self, log_name):
+        if self.file is not None:
+            self.file.close()
+        os.makedirs(self.log_dir, exist_ok = True)
+        self.item_ids, self.category_ids = dict(), dict()
+        has_header = False
+        if os.path.exists(log_name):
+            with open(log_name, 'r') as f:
+                for line in f:
+                    if line.startswith('$FORMAT'):
+                        has_header = True
+                    elif line.startswith('@ITEM '):
+                        code, name = line.rstrip('\n').split(' ', 2)[1:]
+                        self.item_ids[name] = int(code)
+                    elif line.startswith('@CAT '):
+                        code, name = line.rstrip('\n').split(' ', 2)[1:]
+                        self.category_ids[name] = int(code)
+        self.file = open(log_name, 'a+')
+        self.file_name = log_name
+        if not has_header:
+            self.file.write('$FORMAT ' + str(LOG_FORMAT) + '\n')
+
+    def intern(self, ids, tag, name, lines):
+        if name not in ids:
+            ids[name] = len(ids)
+            lines.append(tag + ' ' + str(ids[name]) + ' ' + name + '\n')
+        return ids[name]
+
+    def write_record(self, when, sales, amount):
+        log_name = daily_log_name(when.date(), self.log_dir)
+        if log_name != self.file_name:
+            self.open_log(log_name)
+        sale_time = str(when.time()).split('.')[0]
+        lines = []
+        records = []
+        num_items = 0
+        for item, category, quantity in sales:
+            item_id = self.intern(self.item_ids, '@ITEM', item, lines)
+            category_id = self.intern(self.category_ids, '@CAT', category, lines)
+            records.append('=' + str(item_id) + ' ' + str(category_id) + ' ' + str(quantity) + '\n')
+            num_items += quantity
+        lines.append('$SALE: ' + str(amount) + ' ' + str(sale_time) + ' ' + str(num_items) + ' ITEMS \n')
+        self.file.writelines(lines + records)
+        self.dirty = True
+
+    def flush(self, sync = False):
+        if self.file is not None and self.dirty:
+            self.file.flush()
+            if sync:
+                os.fsync(self.file.fileno())
+        self.dirty = False
+        self.last_flush = time.monotonic()
+
+#################################################
+#
+#   Reading daily logs.
+#
+#   read_daily_log() returns the list of sales
+#   as (time, amount, number of items) and the
+#   number sold of each item, keyed by
+#   (item, category). The Chart Data dialog uses
+#   the faster parser in salesdata.py instead.
+
+def read_daily_log(filename):
+    sales = []
+    item_counts = dict()
+    item_names, category_names = dict(), dict()
+    legacy_time = None
+
+    def count_item(key, quantity):
+        item_counts[key] = item_counts.get(key, 0) + quantity
+
+    with open(filename, 'r') as f:
+        for line in f:
+            line = line.rstrip('\n')
+            if line == '':
+                continue
+            if line.startswith('$SALE'):
+                amount, time, items = line.split(' ')[1:4]
+                sales.append((time, float(amount), int(items)))
+            elif line.startswith('$'):
+                continue
+            elif line.startswith('@ITEM '):
+                code, name = line.split(' ', 2)[1:]
+                item_names[code] = name
+            elif line.startswith('@CAT '):
+                code, name = line.split(' ', 2)[1:]
+                category_names[code] = name
+            elif line.startswith('='):
+                item_id, category_id, quantity = line[1:].split(' ')
+                count_item((item_names[item_id], category_names[category_id]), int(quantity))
+            else:
+                fields = line.split(';')
+                if len(fields) == 4:
+
+                    # Oldest format: consecutive units with the same time are one sale
+
+                    item_name, item_cat, price, time = fields
+                    if time == legacy_time:
+                        time, amount, items = sales[-1]
+                        sales[-1] = (time, amount + float(price), items + 1)
+                    else:
+                        sales.append((time, float(price), 1))
+                        legacy_time = time
+                else:
+                    item_name, item_cat = line.rsplit(';', 1)
+                count_item((item_name, item_cat), 1)
+    return sales, item_counts
+
+#################################################
+#
+#   class LiveSales:
+#
+#   Running half-hour aggregates of the sales
+#   made since the app started, kept in memory
+#   so the live dashboard never reads the logs.
+#   to_dict() gives them in the form of
+#   SalesSummary.to_dict() in salesdata.py.
+
+BUCKET_MINUTES = 30
+
+class LiveSales:
+
+    def __init__(self):
+        self.buckets = dict()
+        self.items_sold = dict()
+
+    # Add a sale, given as a list of (item, category, quantity) lines
+
+    def add_sale(self, when, sales, amount):
+        bucket = when.replace(minute = when.minute - when.minute % BUCKET_MINUTES, second = 0, microsecond = 0)
+        customers, items, profit = self.buckets.get(bucket, (0, 0, 0.0))
+        num_items = 0
+        for item, category, quantity in sales:
+            title = item + '\n(' + category + ')'
+            self.items_sold[title] = self.items_sold.get(title, 0) + quantity
+            num_items += quantity
+        self.buckets[bucket] = (customers + 1, items + num_items, profit + amount)
+
+    def to_dict(self):
+        buckets = sorted(self.buckets)
+        return {
+            'buckets': [bucket.isoformat() for bucket in buckets],
+            'customers': [self.buckets[bucket][0] for bucket in buckets],
+            'items': [self.buckets[bucket][1] for bucket in buckets],
+            'profit': [self.buckets[bucket][2] for bucket in buckets],
+            'titles': list(self.items_sold.keys()),
+            'sold': list(self.items_sold.values()),
+        }
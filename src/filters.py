@@ -0,0 +1,126 @@
+#################################################
+#
+#   class FilterEngine:
+#
+#   Which items of an Inventory pass the table's
+#   filters, as one bool per row:
+#
+#       name        contains the search text
+#       category    is one of the chosen
+#       source      categories or sources
+#       stock       in stock, low (LOW_STOCK or
+#                   fewer left) or out
+#       price       within a min and max
+#
+#   Each filter keeps its own bitmap, computed
+#   from the ItemStore columns (see itemstore.py)
+#   in a few NumPy operations, and the result is
+#   the AND of them all. Changing one filter only
+#   recomputes its bitmap. Any change to the
+#   items makes every bitmap stale, since it may
+#   have moved an item in or out of any of them.
+#
+#   Filters are off when set to None, or to
+#   STOCK_ALL for the stock filter.
+
+import numpy as np
+
+LOW_STOCK = 5
+
+STOCK_ALL = 'all'
+STOCK_IN = 'in'
+STOCK_LOW = 'low'
+STOCK_OUT = 'out'
+
+class FilterEngine:
+
+    def __init__(self, inventory):
+        self.inventory = inventory
+        self.settings = {'name': None, 'category': None, 'source': None, 'stock': STOCK_ALL, 'price': None}
+        self.bitmaps = dict()
+        self.revision = None
+
+    # Each setter returns whether the filter changed
+
+    def set(self, name, value):
+        if self.settings[name] == value:
+            return False
+        self.settings[name] = value
+        self.bitmaps.pop(name, None)
+        return True
+
+    def set_query(self, text):
+        return self.set('name', text or None)
+
+    def set_categories(self, names):
+        return self.set('category', None if names is None else frozenset(names))
+
+    def set_sources(self, names):
+        return self.set('source', None if names is None else frozenset(names))
+
+    def set_stock(self, stock):
+        return self.set('stock', stock)
+
+    # Either bound may be None
+
+    def set_price_range(self, low, high):
+        return self.set('price', None if low is None and high is None else (low, high))
+
+    def name_bitmap(self, query):
+        rows = self.inventory.search_index.search(query)
+        if rows is None:
+            return None
+        bitmap = np.zeros(len(self.inventory.items), dtype = bool)
+        bitmap[list(rows)] = True
+        return bitmap
+
+    def category_bitmap(self, names):
+        items = self.inventory.items
+        return code_bitmap(items.category_table, items.category_codes, names)
+
+    def source_bitmap(self, names):
+        items = self.inventory.items
+        return code_bitmap(items.source_table, items.source_codes, names)
+
+    def stock_bitmap(self, stock):
+        counts = self.inventory.items.counts
+        if stock == STOCK_IN:
+            return counts > 0
+        elif stock == STOCK_LOW:
+            return (counts > 0) & (counts <= LOW_STOCK)
+        elif stock == STOCK_OUT:
+            return counts <= 0
+        return None
+
+    def price_bitmap(self, price_range):
+        low, high = price_range
+        prices = self.inventory.items.prices
+        bitmap = np.ones(len(prices), dtype = bool)
+        if low is not None:
+            bitmap &= prices >= low
+        if high is not None:
+            bitmap &= prices <= high
+        return bitmap
+
+    # Bool array of the rows passing every filter
+
+    def visible(self):
+        if self.revision != self.inventory.revision:
+            self.bitmaps.clear()
+            self.revision = self.inventory.revision
+        visible = np.ones(len(self.inventory.items), dtype = bool)
+        for name, value in self.settings.items():
+            if name not in self.bitmaps:
+                off = value is None or (name == 'stock' and value == STOCK_ALL)
+                self.bitmaps[name] = None if off else getattr(self, name + '_bitmap')(value)
+            if self.bitmaps[name] is not None:
+                visible &= self.bitmaps[name]
+        return visible
+
+# Rows whose code is that of one of the names, looked up through a table
+# of one bool per code
+
+def code_bitmap(table, codes, names):
+    wanted = np.zeros(len(table), dtype = bool)
+    wanted[[table.codes[name] for name in names if name in table.codes]] = True
+    return wanted[codes]
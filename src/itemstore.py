@@ -0,0 +1,264 @@
+#################################################
+#
+#   class ItemStore:
+#
+#   Every item of an Inventory, kept by column
+#   rather than as one object per item:
+#
+#       names           list of str
+#       skus            list of str, the SKU or
+#                       barcode, '' for none
+#       prices          float64 per item
+#       counts          int32 per item, in stock
+#       sell_counts     int32 per item, in the
+#                       cart
+#       category_codes  int32 per item, index into
+#       source_codes    the category or source
+#                       table
+#
+#   The tables only grow, so a code stays valid
+#   for as long as the store lives. An item costs
+#   24 bytes of arrays plus its name and SKU, and
+#   whole inventory questions (stock value, every
+#   item in a category, repricing) are single
+#   NumPy expressions over the columns.
+#
+#   store[row] is an ItemRow, a view reading that
+#   row's columns with the attribute names the
+#   rest of the app has always used. Changes go
+#   through the set_ methods.
+
+import numpy as np
+
+INITIAL_CAPACITY = 64
+
+class CodeTable:
+
+    def __init__(self, names = ()):
+        self.names = []
+        self.codes = dict()
+        for name in names:
+            self.code(name)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, code):
+        return self.names[code]
+
+    # Code of a name, giving it the next one if it is new
+
+    def code(self, name):
+        code = self.codes.get(name)
+        if code is None:
+            code = self.codes[name] = len(self.names)
+            self.names.append(name)
+        return code
+
+    def copy(self):
+        return CodeTable(self.names)
+
+class ItemRow:
+
+    __slots__ = ('store', 'row')
+
+    def __init__(self, store, row):
+        self.store = store
+        self.row = row
+
+    @property
+    def product_name(self):
+        return self.store.names[self.row]
+
+    @property
+    def product_category(self):
+        return self.store.category_table[int(self.store.category_codes[self.row])]
+
+    @property
+    def product_source(self):
+        return self.store.source_table[int(self.store.source_codes[self.row])]
+
+    @property
+    def price(self):
+        return float(self.store.prices[self.row])
+
+    @property
+    def inv_count(self):
+        return int(self.store.counts[self.row])
+
+    @property
+    def sell_count(self):
+        return int(self.store.sell_counts[self.row])
+
+    @property
+    def sku(self):
+        return self.store.skus[self.row]
+
+    def fields(self):
+        return (self.product_name, self.product_category, self.product_source, self.price, self.inv_count, self.sku)
+
+    def __str__(self):
+        return ','.join([self.product_name, self.product_category, self.product_source, str(self.price), str(self.inv_count), self.sku])
+
+class ItemStore:
+
+    def __init__(self, capacity = INITIAL_CAPACITY):
+        self.names = []
+        self.skus = []
+        self.category_table = CodeTable(['-'])
+        self.source_table = CodeTable(['-'])
+        self.price_column = np.zeros(capacity, dtype = np.float64)
+        self.count_column = np.zeros(capacity, dtype = np.int32)
+        self.sell_column = np.zeros(capacity, dtype = np.int32)
+        self.category_column = np.zeros(capacity, dtype = np.int32)
+        self.source_column = np.zeros(capacity, dtype = np.int32)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, row):
+        if not 0 <= row < len(self.names):
+            raise IndexError(row)
+        return ItemRow(self, row)
+
+    def __iter__(self):
+        return (ItemRow(self, row) for row in range(len(self.names)))
+
+    # The columns, cut to the number of items. These are views, so
+    # writing to them changes the store.
+
+    @property
+    def prices(self):
+        return self.price_column[:len(self.names)]
+
+    @property
+    def counts(self):
+        return self.count_column[:len(self.names)]
+
+    @property
+    def sell_counts(self):
+        return self.sell_column[:len(self.names)]
+
+    @property
+    def category_codes(self):
+        return self.category_column[:len(self.names)]
+
+    @property
+    def source_codes(self):
+        return self.source_column[:len(self.names)]
+
+    def reserve(self, size):
+        capacity = len(self.price_column)
+        if size <= capacity:
+            return
+        while capacity < size:
+            capacity *= 2
+        for name in ('price_column', 'count_column', 'sell_column', 'category_column', 'source_column'):
+            old = getattr(self, name)
+            new = np.zeros(capacity, dtype = old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    # Append items given as (name, category, source, price, count), with
+    # or without a SKU after the count, or as another ItemStore
+
+    def extend(self, items):
+        if not len(items):
+            return
+        if isinstance(items, ItemStore):
+            self.extend_store(items)
+            return
+        first = len(self.names)
+        last = first + len(items)
+        self.reserve(last)
+        columns = list(zip(*items))
+        names, categories, sources, prices, counts = columns[:5]
+        skus = columns[5] if len(columns) > 5 else [item[5] if len(item) > 5 else '' for item in items]
+        self.price_column[first:last] = prices
+        self.count_column[first:last] = counts
+        self.sell_column[first:last] = 0
+        self.category_column[first:last] = [self.category_table.code(category) for category in categories]
+        self.source_column[first:last] = [self.source_table.code(source) for source in sources]
+        self.names.extend(names)
+        self.skus.extend(skus)
+
+    # The other store's category and source codes are mapped to this
+    # store's through a table per code, so no item is looked at alone
+
+    def extend_store(self, store):
+        first = len(self.names)
+        last = first + len(store)
+        self.reserve(last)
+        self.price_column[first:last] = store.prices
+        self.count_column[first:last] = store.counts
+        self.sell_column[first:last] = 0
+        self.category_column[first:last] = np.array([self.category_table.code(name) for name in store.category_table.names], dtype = np.int32)[store.category_codes]
+        self.source_column[first:last] = np.array([self.source_table.code(name) for name in store.source_table.names], dtype = np.int32)[store.source_codes]
+        self.names.extend(store.names)
+        self.skus.extend(store.skus)
+
+    def clear(self):
+        self.names = []
+        self.skus = []
+        self.sell_column[:] = 0
+
+    def set_name(self, row, name):
+        self.names[row] = name
+
+    def set_sku(self, row, sku):
+        self.skus[row] = sku
+
+    def set_category(self, row, category):
+        self.category_column[row] = self.category_table.code(category)
+
+    def set_source(self, row, source):
+        self.source_column[row] = self.source_table.code(source)
+
+    def set_price(self, row, price):
+        self.price_column[row] = float(price)
+
+    # Set the stock count, returning whether that lowered the sell count
+
+    def set_count(self, row, count):
+        self.count_column[row] = count
+        if self.sell_column[row] <= count:
+            return False
+        self.sell_column[row] = max(count, 0)
+        return True
+
+    def set_sell_count(self, row, count):
+        self.sell_column[row] = max(0, min(count, int(self.count_column[row])))
+
+    # Rows with any of the given categories or sources, as a bool array
+
+    def category_mask(self, categories):
+        codes = [self.category_table.codes[category] for category in categories if category in self.category_table.codes]
+        return np.isin(self.category_codes, codes)
+
+    def source_mask(self, sources):
+        codes = [self.source_table.codes[source] for source in sources if source in self.source_table.codes]
+        return np.isin(self.source_codes, codes)
+
+    # Value of the stock at its selling price
+
+    def stock_value(self):
+        return float(np.dot(self.prices, self.counts))
+
+    def fields_list(self):
+        return list(zip(self.names,
+                        [self.category_table[code] for code in self.category_codes.tolist()],
+                        [self.source_table[code] for code in self.source_codes.tolist()],
+                        self.prices.tolist(), self.counts.tolist(), self.skus))
+
+    # A copy that stays as it is while this store changes, for saving
+    # on another thread
+
+    def copy(self):
+        store = ItemStore(max(len(self.names), 1))
+        store.names = list(self.names)
+        store.skus = list(self.skus)
+        store.category_table = self.category_table.copy()
+        store.source_table = self.source_table.copy()
+        for name in ('prices', 'counts', 'sell_counts', 'category_codes', 'source_codes'):
+            getattr(store, name)[:] = getattr(self, name)
+        return store
@@ -0,0 +1,194 @@
+#################################################
+#
+#   class LifetimeStats:
+#
+#   Lifetime sale counts per item, kept in a
+#   dict keyed by item tag ("[Category] Name").
+#
+#   The counts live on disk in two files:
+#
+#       lifetime-logs          snapshot, one
+#                              "tag #count" line
+#                              per item
+#       lifetime-logs.journal  one JSON line per
+#                              sale since the
+#                              snapshot was written
+#
+#   Each sale is appended to the journal and
+#   synced before record() returns, so its cost
+#   does not depend on how many items have ever
+#   been sold. With background = True the counts
+#   are still updated at once, but the writing
+#   is handed to a thread that syncs whatever
+#   has queued up together, as the daily log
+#   does. Every COMPACT_EVERY sales the
+#   counts are written to a new snapshot, which
+#   replaces the old one atomically, and the
+#   journal is emptied.
+#
+#   Journal entries are numbered and the
+#   snapshot remembers the last entry it
+#   includes, so a crash at any point never
+#   loses or double counts a sale. A torn last
+#   line in the journal is a sale that was never
+#   recorded and is ignored.
+#
+#   With read_only = True the counts are loaded
+#   and nothing is ever written, not even the
+#   truncation of a torn line, for tools that
+#   only report them.
+
+import os
+import json
+import queue
+import threading
+
+LIFETIME_LOG = './logs/lifetime-logs'
+COMPACT_EVERY = 500
+
+def item_tag(category, name):
+    return '[' + category + '] ' + name
+
+class LifetimeStats:
+
+    def __init__(self, path = LIFETIME_LOG, compact_every = COMPACT_EVERY, background = False, read_only = False):
+        self.path = path
+        self.read_only = read_only
+        self.journal_path = path + '.journal'
+        self.compact_every = compact_every
+        self.counts = dict()
+        self.seq = 0
+        self.pending = 0
+        self.journal = None
+        self.queue = None
+        self.error = None
+        if os.path.dirname(path) and not read_only:
+            os.makedirs(os.path.dirname(path), exist_ok = True)
+        self.load()
+        if background and not read_only:
+            self.queue = queue.Queue()
+            self.writer = threading.Thread(target = self.run, name = 'LifetimeStatsWriter', daemon = True)
+            self.writer.start()
+
+    def load(self):
+        snapshot_seq = 0
+        if os.path.exists(self.path):
+            with open(self.path, 'r') as f:
+                for line in f:
+                    line = line.rstrip('\n')
+                    if line.startswith('$ JOURNAL '):
+                        snapshot_seq = int(line.split(' ')[2])
+                    elif ' #' in line:
+                        tag, count = line.rsplit(' #', 1)
+                        self.counts[tag.strip()] = int(count)
+        self.seq = snapshot_seq
+        if os.path.exists(self.journal_path):
+            good_length = 0
+            with open(self.journal_path, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break
+                    good_length += len(line)
+                    if entry['seq'] <= snapshot_seq:
+                        continue
+                    self.apply(entry['sold'])
+                    self.seq = entry['seq']
+                    self.pending += 1
+
+            # Drop a torn last line so new sales are not appended to it
+
+            if good_length < os.path.getsize(self.journal_path) and not self.read_only:
+                os.truncate(self.journal_path, good_length)
+        if not self.read_only:
+            self.journal = open(self.journal_path, 'a')
+
+    def apply(self, sold):
+        for tag, count in sold.items():
+            self.counts[tag] = self.counts.get(tag, 0) + count
+
+    # Record one sale, given as a dict of item tag -> number sold
+
+    def record(self, sold):
+        if self.read_only:
+            raise ValueError(self.path + ' was opened read only')
+        if not sold:
+            return
+        self.seq += 1
+        self.apply(sold)
+        self.pending += 1
+
+        # A snapshot due after this sale gets a copy of the counts as
+        # they are now, since later sales may change them before it is
+        # written
+
+        counts = None
+        if self.pending >= self.compact_every:
+            counts = dict(self.counts)
+            self.pending = 0
+        if self.queue is not None:
+            self.queue.put((self.seq, sold, counts))
+        else:
+            self.write([(self.seq, sold, counts)])
+
+    # Write (seq, sold, counts) jobs, syncing once at the end and
+    # before every snapshot
+
+    def write(self, jobs):
+        for seq, sold, counts in jobs:
+            self.journal.write(json.dumps({'seq': seq, 'sold': sold}) + '\n')
+            if counts is not None:
+                self.sync()
+                self.write_snapshot(seq, counts)
+        self.sync()
+
+    def sync(self):
+        self.journal.flush()
+        os.fsync(self.journal.fileno())
+
+    def run(self):
+        running = True
+        while running:
+            jobs = [self.queue.get()]
+            while True:
+                try:
+                    jobs.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            if None in jobs:
+                jobs = jobs[:jobs.index(None)]
+                running = False
+            try:
+                self.write(jobs)
+            except OSError as error:
+                self.error = error
+
+    def compact(self):
+        self.write_snapshot(self.seq, self.counts)
+        self.pending = 0
+
+    def write_snapshot(self, seq, counts):
+        temp_path = self.path + '.tmp'
+        with open(temp_path, 'w') as f:
+            f.write('$ JOURNAL ' + str(seq) + '\n')
+            f.writelines([tag + ' #' + str(count) + '\n' for tag, count in counts.items()])
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+        self.journal.close()
+        self.journal = open(self.journal_path, 'w')
+
+    def close(self):
+        if self.journal is None:
+            return
+        if self.queue is not None:
+            self.queue.put(None)
+            self.writer.join()
+            self.queue = None
+        if self.pending:
+            self.compact()
+        self.journal.close()
+        self.journal = None
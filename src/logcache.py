@@ -0,0 +1,156 @@
+#################################################
+#
+#   class LogCache:
+#
+#   On-disk cache of parsed daily logs, so the
+#   charts of a day whose log has not changed
+#   open without parsing it again.
+#
+#   Each entry is the SalesSummary of one log as
+#   JSON, named after a hash of the log's path,
+#   size and modification time. Any change to
+#   the log gives it a new key, and the stale
+#   entry is eventually evicted: once the cache
+#   is over max_bytes, the least recently used
+#   entries are deleted first.
+#
+#   load_date_range() charts several days at
+#   once. Cached logs are read directly and the
+#   rest are parsed in parallel, one log per
+#   worker process, before the per-log
+#   summaries are merged.
+
+import os
+import re
+import json
+import atexit
+import hashlib
+import multiprocessing
+from datetime import date
+from concurrent.futures import ProcessPoolExecutor
+
+from salesdata import SalesSummary, parse_daily_log
+
+CACHE_DIR = './logs/.cache'
+MAX_CACHE_BYTES = 64 * 1024 * 1024
+
+# Bump when the parser or SalesSummary change, to ignore old entries
+
+CACHE_VERSION = 1
+
+class LogCache:
+
+    def __init__(self, cache_dir = CACHE_DIR, max_bytes = MAX_CACHE_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    def entry_path(self, log_path):
+        stat = os.stat(log_path)
+        identity = '|'.join([str(CACHE_VERSION), os.path.abspath(log_path), str(stat.st_size), str(stat.st_mtime_ns)])
+        return os.path.join(self.cache_dir, hashlib.sha1(identity.encode()).hexdigest() + '.json')
+
+    def get(self, log_path):
+        entry = self.entry_path(log_path)
+        try:
+            with open(entry, 'r') as f:
+                summary = SalesSummary.from_dict(json.load(f))
+        except (OSError, ValueError, KeyError):
+            return None
+
+        # Mark the entry as recently used, unless another process has
+        # just evicted it
+
+        try:
+            os.utime(entry)
+        except FileNotFoundError:
+            pass
+        return summary
+
+    def put(self, log_path, summary):
+        entry = self.entry_path(log_path)
+        os.makedirs(self.cache_dir, exist_ok = True)
+        temp_path = entry + '.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(summary.to_dict(), f)
+        os.replace(temp_path, entry)
+        self.evict()
+
+    # Several worker processes may evict at once, so an entry can be
+    # gone by the time it is looked at or removed
+
+    def evict(self):
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.json'):
+                try:
+                    stat = os.stat(os.path.join(self.cache_dir, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+        total = sum(size for mtime, size, name in entries)
+        for mtime, size, name in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.cache_dir, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    # Summary of a log, parsing it only if it is not cached
+
+    def load(self, log_path):
+        summary = self.get(log_path)
+        if summary is None:
+            summary = parse_daily_log(log_path)
+            self.put(log_path, summary)
+        return summary
+
+#################################################
+#
+#   Loading a range of days.
+
+LOG_DIR = './logs'
+
+pool = None
+
+def get_pool():
+    global pool
+    if pool is None:
+
+        # Spawn rather than fork, since the parent may be running Qt
+
+        pool = ProcessPoolExecutor(max_workers = os.cpu_count(), mp_context = multiprocessing.get_context('spawn'))
+        atexit.register(pool.shutdown)
+    return pool
+
+def logs_in_range(start, end, log_dir = LOG_DIR):
+    logs = []
+    for name in os.listdir(log_dir):
+        match = re.fullmatch(r'daily-log-(\d{4}-\d{2}-\d{2})\.txt', name)
+        if match and start <= date.fromisoformat(match.group(1)) <= end:
+            logs.append(os.path.join(log_dir, name))
+    return sorted(logs)
+
+# Run in a worker process: parse a log and store it in the cache
+
+def load_in_worker(log_path, cache_dir, max_bytes):
+    return LogCache(cache_dir, max_bytes).load(log_path).to_dict()
+
+def load_date_range(start, end, cache = None, log_dir = LOG_DIR):
+    if cache is None:
+        cache = LogCache()
+    summaries = []
+    uncached = []
+    for log_path in logs_in_range(start, end, log_dir):
+        summary = cache.get(log_path)
+        if summary is None:
+            uncached.append(log_path)
+        else:
+            summaries.append(summary)
+    if len(uncached) == 1:
+        summaries.append(cache.load(uncached[0]))
+    elif uncached:
+        jobs = [get_pool().submit(load_in_worker, log_path, cache.cache_dir, cache.max_bytes) for log_path in uncached]
+        summaries += [SalesSummary.from_dict(job.result()) for job in jobs]
+    return SalesSummary.merge(summaries)
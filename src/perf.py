@@ -0,0 +1,156 @@
+#################################################
+#
+#   Opt-in timing of the hot paths.
+#
+#   Functions wrapped with @timed(name), and
+#   blocks inside `with measure(name):`, add
+#   their duration to a latency histogram for
+#   that name while recording is enabled. When
+#   it is not, the wrapper only checks a flag
+#   and measure() hands back a shared no-op, so
+#   instrumented code costs next to nothing.
+#
+#   Histograms have HISTOGRAM_STEPS buckets per
+#   doubling of the duration, which is enough to
+#   read percentiles to within about 20%.
+#
+#   write_metrics() appends every histogram as
+#   one JSON line to METRICS_FILE, which rotates
+#   after METRICS_MAX_BYTES and keeps
+#   METRICS_BACKUPS old files.
+
+import functools
+import json
+import logging
+import logging.handlers
+import math
+import os
+import threading
+import time
+
+METRICS_FILE = './logs/metrics.jsonl'
+METRICS_MAX_BYTES = 1024 * 1024
+METRICS_BACKUPS = 3
+
+HISTOGRAM_STEPS = 4
+
+enabled = os.environ.get('FPN_PERF', '') not in ('', '0')
+histograms = dict()
+lock = threading.Lock()
+metrics_logger = None
+
+class Histogram:
+
+    def __init__(self):
+        self.buckets = dict()
+        self.count = 0
+        self.total = 0.0
+        self.worst = 0.0
+
+    def add(self, seconds):
+        microseconds = max(seconds * 1e6, 1.0)
+        bucket = int(math.log2(microseconds) * HISTOGRAM_STEPS)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += seconds
+        self.worst = max(self.worst, seconds)
+
+    # Upper bound of the bucket holding the given percentile, in seconds
+
+    def percentile(self, percent):
+        if self.count == 0:
+            return 0.0
+        wanted = self.count * percent / 100
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= wanted:
+                return min(2 ** ((bucket + 1) / HISTOGRAM_STEPS) / 1e6, self.worst)
+        return self.worst
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else 0.0,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+            'max': self.worst,
+            'buckets': {str(bucket): count for bucket, count in sorted(self.buckets.items())},
+        }
+
+def enable(on = True):
+    global enabled
+    enabled = on
+
+def record(name, seconds):
+    with lock:
+        histogram = histograms.get(name)
+        if histogram is None:
+            histogram = histograms[name] = Histogram()
+        histogram.add(seconds)
+
+def timed(name):
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return fn(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+class Measurement:
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.start)
+
+class NoMeasurement:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+NO_MEASUREMENT = NoMeasurement()
+
+def measure(name):
+    return Measurement(name) if enabled else NO_MEASUREMENT
+
+# (name, count, p50, p95, p99) per operation, in seconds
+
+def summary():
+    with lock:
+        return [(name, histogram.count, histogram.percentile(50), histogram.percentile(95), histogram.percentile(99))
+                for name, histogram in sorted(histograms.items())]
+
+def reset():
+    with lock:
+        histograms.clear()
+
+def write_metrics(path = METRICS_FILE):
+    global metrics_logger
+    with lock:
+        if not histograms:
+            return
+        line = json.dumps({'time': time.time(), 'operations': {name: histogram.to_dict() for name, histogram in histograms.items()}})
+    if metrics_logger is None:
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok = True)
+        metrics_logger = logging.getLogger('4peanuts.metrics')
+        metrics_logger.propagate = False
+        metrics_logger.setLevel(logging.INFO)
+        metrics_logger.addHandler(logging.handlers.RotatingFileHandler(path, maxBytes = METRICS_MAX_BYTES, backupCount = METRICS_BACKUPS))
+    metrics_logger.info(line)
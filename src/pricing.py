@@ -0,0 +1,117 @@
+#################################################
+#
+#   Pricing of a cart of items.
+#
+#   A cart is described by (category, price,
+#   quantity) lines rather than one entry per
+#   unit. Deals apply per category to the
+#   cheapest units first:
+#
+#       BOGO, buy a get b: for every a+b units,
+#       the b cheapest are free.
+#
+#       BULK, buy a for $b: the cheapest units
+#       are sold in groups of a for $b each, and
+#       the rest are sold at full price.
+#
+#   Totals are rounded to the cent.
+
+import perf
+
+def aggregate_lines(lines):
+    counts = dict()
+    for category, price, quantity in lines:
+        if quantity > 0:
+            key = (category, price)
+            counts[key] = counts.get(key, 0) + quantity
+    by_category = dict()
+    for (category, price), quantity in counts.items():
+        by_category.setdefault(category, []).append((price, quantity))
+    return by_category
+
+# Total cost of the units priced at the most expensive end of a
+# category, skipping the `skipped` cheapest units.
+# price_counts must be sorted by price.
+
+def cost_after_skipping(price_counts, skipped):
+    total = 0.0
+    for price, quantity in price_counts:
+        if skipped >= quantity:
+            skipped -= quantity
+            continue
+        total += price * (quantity - skipped)
+        skipped = 0
+    return total
+
+def category_price(price_counts, deal = None):
+    price_counts = sorted(price_counts)
+    num_bought = sum(quantity for price, quantity in price_counts)
+    if deal is not None and deal[0] == 'BOGO' and deal[1] + deal[2] > 0:
+        free = (num_bought // (deal[1] + deal[2])) * deal[2]
+        return cost_after_skipping(price_counts, free)
+    elif deal is not None and deal[0] == 'BULK' and deal[1] > 0:
+        times = num_bought // deal[1]
+        return cost_after_skipping(price_counts, times * deal[1]) + times * deal[2]
+    return cost_after_skipping(price_counts, 0)
+
+@perf.timed('calculate_sales_price')
+def calculate_sales_price(lines, deals):
+    sales_price = 0.0
+    for category, price_counts in aggregate_lines(lines).items():
+        sales_price += category_price(price_counts, deals.get(category))
+    return round(sales_price, 2)
+
+#################################################
+#
+#   class Cart:
+#
+#   Keeps the lines of the cart being rung up
+#   grouped by category, with the price of each
+#   category cached. Changing one line only
+#   reprices that line's category. The cache of
+#   a category must be invalidated whenever its
+#   deal changes.
+
+class Cart:
+
+    def __init__(self, deals):
+        self.deals = deals
+        self.lines = dict()
+        self.category_lines = dict()
+        self.category_totals = dict()
+
+    def set_line(self, key, category, price, quantity):
+        old_line = self.lines.pop(key, None)
+        if old_line is not None:
+            old_category = old_line[0]
+            del self.category_lines[old_category][key]
+            if not self.category_lines[old_category]:
+                del self.category_lines[old_category]
+            self.category_totals.pop(old_category, None)
+        if quantity > 0:
+            self.lines[key] = (category, price, quantity)
+            self.category_lines.setdefault(category, dict())[key] = (price, quantity)
+            self.category_totals.pop(category, None)
+
+    def invalidate(self, category = None):
+        if category is None:
+            self.category_totals.clear()
+        else:
+            self.category_totals.pop(category, None)
+
+    def clear(self):
+        self.lines.clear()
+        self.category_lines.clear()
+        self.category_totals.clear()
+
+    @perf.timed('cart_total')
+    def total(self):
+        sales_price = 0.0
+        for category, lines in self.category_lines.items():
+            if category not in self.category_totals:
+                price_counts = dict()
+                for price, quantity in lines.values():
+                    price_counts[price] = price_counts.get(price, 0) + quantity
+                self.category_totals[category] = category_price(price_counts.items(), self.deals.get(category))
+            sales_price += self.category_totals[category]
+        return round(sales_price, 2)
@@ -0,0 +1,219 @@
+#################################################
+#
+#   Columnar parsing of daily logs for charts.
+#
+#   parse_daily_log() reads a whole log into
+#   pandas columns and aggregates them with
+#   group-bys instead of line by line. It
+#   accepts every format read_daily_log() in
+#   dailylog.py does.
+#
+#   Lines are told apart by their first bytes
+#   with NumPy, and the lines of each kind are
+#   cut out of the file as one block that
+#   pandas' C parser reads in a single call.
+#
+#   The result is a SalesSummary: per half-hour
+#   bucket, the number of customers, items sold
+#   and profit made, plus the number sold of
+#   each item.
+
+import csv
+import io
+import re
+
+import numpy as np
+import pandas as pd
+
+BUCKET_MINUTES = 30
+NO_DATE = '1900-01-01'
+
+class SalesSummary:
+
+    def __init__(self, buckets = None, items_sold = None):
+        if buckets is None:
+            buckets = pd.DataFrame({'customers': [], 'items': [], 'profit': []}, index = pd.DatetimeIndex([], name = 'bucket'))
+        if items_sold is None:
+            items_sold = pd.Series([], dtype = 'int64', name = 'sold')
+        self.buckets = buckets
+        self.items_sold = items_sold
+
+    # Series in the shape the four charts draw them
+
+    def bucket_times(self):
+        return self.buckets.index.to_pydatetime()
+
+    def customers(self):
+        return self.buckets['customers'].to_numpy()
+
+    def items(self):
+        return self.buckets['items'].to_numpy()
+
+    def cumulative_profit(self):
+        return self.buckets['profit'].cumsum().to_numpy()
+
+    def item_titles(self):
+        return list(self.items_sold.index)
+
+    def item_counts(self):
+        return self.items_sold.to_numpy()
+
+    # Combine the summaries of several logs into one
+
+    @classmethod
+    def merge(cls, summaries):
+        summaries = [summary for summary in summaries if not summary.buckets.empty or not summary.items_sold.empty]
+        if not summaries:
+            return cls()
+        buckets = pd.concat([summary.buckets for summary in summaries]).groupby(level = 0).sum()
+        items_sold = pd.concat([summary.items_sold for summary in summaries]).groupby(level = 0, sort = False).sum().rename('sold')
+        return cls(buckets, items_sold)
+
+    # Plain dict form, for storing summaries as JSON
+
+    def to_dict(self):
+        return {
+            'buckets': [stamp.isoformat() for stamp in self.buckets.index],
+            'customers': self.buckets['customers'].tolist(),
+            'items': self.buckets['items'].tolist(),
+            'profit': self.buckets['profit'].tolist(),
+            'titles': self.item_titles(),
+            'sold': self.items_sold.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        buckets = pd.DataFrame({
+            'customers': pd.Series(data['customers'], dtype = 'int64'),
+            'items': pd.Series(data['items'], dtype = 'int64'),
+            'profit': pd.Series(data['profit'], dtype = 'float64'),
+        })
+        buckets.index = pd.DatetimeIndex(data['buckets'], name = 'bucket')
+        items_sold = pd.Series(data['sold'], index = pd.Index(data['titles'], dtype = object), dtype = 'int64', name = 'sold')
+        return cls(buckets, items_sold)
+
+def log_date(filename):
+    match = re.search(r'(\d{4}-\d{2}-\d{2})', filename)
+    return match.group(1) if match else NO_DATE
+
+def bucket_index(date, hours, minutes):
+    offsets = hours.to_numpy() * 60 + (minutes.to_numpy() // BUCKET_MINUTES) * BUCKET_MINUTES
+    return pd.Timestamp(date) + pd.to_timedelta(offsets, unit = 'm')
+
+#################################################
+#
+#   class LogLines:
+#
+#   The raw bytes of a log, with the start, end
+#   and first bytes of every line found with
+#   NumPy so lines of one kind can be selected
+#   without looking at them one by one.
+
+class LogLines:
+
+    def __init__(self, data):
+        if not data.endswith(b'\n'):
+            data += b'\n'
+        self.buffer = np.frombuffer(data, dtype = np.uint8)
+        self.ends = np.flatnonzero(self.buffer == ord('\n'))
+        self.starts = np.concatenate(([0], self.ends[:-1] + 1))
+        self.lengths = self.ends - self.starts + 1
+        padded = np.concatenate((self.buffer, np.zeros(2, dtype = np.uint8)))
+        self.first = padded[self.starts]
+        self.second = padded[self.starts + 1]
+        self.empty = self.lengths == 1
+
+    def starting_with(self, first, second = None):
+        mask = (self.first == ord(first)) & ~self.empty
+        if second is not None:
+            mask &= self.second == ord(second)
+        return mask
+
+    def count_per_line(self, char):
+        positions = np.flatnonzero(self.buffer == ord(char))
+        return np.bincount(np.searchsorted(self.ends, positions), minlength = len(self.ends))
+
+    # Bytes of the selected lines, each without its first `skip` bytes
+
+    def select(self, line_mask, skip = 0):
+        byte_mask = np.repeat(line_mask, self.lengths)
+        for offset in range(skip):
+            byte_mask[self.starts[line_mask] + offset] = False
+        return self.buffer[byte_mask].tobytes()
+
+    def read(self, line_mask, names, dtype, skip = 0, sep = ' ', colons_as_sep = False):
+        if not line_mask.any():
+            return pd.DataFrame({name: pd.Series([], dtype = dtype[name]) for name in names})
+        block = self.select(line_mask, skip)
+        if colons_as_sep:
+            block = block.replace(b':', sep.encode())
+        return pd.read_csv(io.BytesIO(block), sep = sep, header = None, names = names,
+                           usecols = range(len(names)), dtype = dtype, quoting = csv.QUOTE_NONE, keep_default_na = False)
+
+def parse_daily_log(filename, date = None):
+    if date is None:
+        date = log_date(filename)
+    with open(filename, 'rb') as f:
+        lines = LogLines(f.read())
+
+    # Sales, with interned item lines in the current format
+
+    sales = lines.read(lines.starting_with('$', 'S'), ['amount', 'hour', 'minute', 'second', 'items'],
+                       {'amount': 'float64', 'hour': 'int64', 'minute': 'int64', 'second': 'int64', 'items': 'int64'},
+                       skip = len('$SALE: '), colons_as_sep = True)
+    item_names = read_definitions(lines, 'I', '@ITEM ')
+    category_names = read_definitions(lines, 'C', '@CAT ')
+    records = lines.read(lines.starting_with('='), ['item', 'category', 'quantity'], {'item': 'int64', 'category': 'int64', 'quantity': 'int64'}, skip = 1)
+    records = records.groupby(['item', 'category'], sort = False)['quantity'].sum().reset_index()
+    records = pd.DataFrame({
+        'item': item_names[records['item'].to_numpy()],
+        'category': category_names[records['category'].to_numpy()],
+        'quantity': records['quantity'].to_numpy(),
+    })
+
+    # Lines with no prefix are one unit each: item;category, or
+    # item;category;price;time in the oldest logs, where consecutive
+    # units with the same time make up one sale
+
+    plain = ~lines.empty & ~np.isin(lines.first, [ord('$'), ord('@'), ord('=')])
+    field_counts = lines.count_per_line(';')
+    units = lines.read(plain & (field_counts == 1), ['item', 'category'], {'item': 'str', 'category': 'str'}, sep = ';')
+    units['quantity'] = 1
+    legacy = lines.read(plain & (field_counts == 3), ['item', 'category', 'price', 'time'], {'item': 'str', 'category': 'str', 'price': 'float64', 'time': 'str'}, sep = ';')
+    if not legacy.empty:
+        sale_ids = (legacy['time'] != legacy['time'].shift()).cumsum()
+        legacy_sales = pd.DataFrame({
+            'amount': legacy['price'],
+            'hour': legacy['time'].str.slice(0, 2).astype('int64'),
+            'minute': legacy['time'].str.slice(3, 5).astype('int64'),
+            'items': 1,
+        }).groupby(sale_ids, sort = False).agg({'amount': 'sum', 'hour': 'first', 'minute': 'first', 'items': 'sum'})
+        sales = pd.concat([sales, legacy_sales], ignore_index = True)
+        units = pd.concat([units, legacy[['item', 'category']].assign(quantity = 1)], ignore_index = True)
+
+    # Aggregate per half-hour bucket and per item
+
+    sales = sales.assign(bucket = bucket_index(date, sales['hour'], sales['minute']))
+    buckets = sales.groupby('bucket').agg(
+        customers = ('amount', 'size'),
+        items = ('items', 'sum'),
+        profit = ('amount', 'sum'),
+    )
+    units = units.groupby(['item', 'category'], sort = False)['quantity'].sum().reset_index()
+    sold = pd.concat([records, units], ignore_index = True)
+    titles = sold['item'] + '\n(' + sold['category'] + ')'
+    items_sold = sold['quantity'].groupby(titles, sort = False).sum().rename('sold')
+    return SalesSummary(buckets, items_sold)
+
+# Names defined by "@ITEM id name" or "@CAT id name" lines, as an array indexed by id
+
+def read_definitions(lines, second, prefix):
+    block = lines.select(lines.starting_with('@', second), skip = len(prefix)).decode()
+    names = dict()
+    for line in block.splitlines():
+        code, name = line.split(' ', 1)
+        names[int(code)] = name
+    table = np.empty(max(names, default = -1) + 1, dtype = object)
+    for code, name in names.items():
+        table[code] = name
+    return table
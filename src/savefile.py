@@ -0,0 +1,368 @@
+#################################################
+#
+#   Reading and writing .fpn save files.
+#
+#   A save file has four sections, each opened
+#   by a "$ NAME" line:
+#
+#       $ CATEGORIES    one category per line
+#       $ SOURCES       one source per line
+#       $ DEALS         "category:deal" per line
+#       $ ITEMS         "name,category,source,
+#                       price,count" per line
+#
+#   and a fifth when any item has a SKU:
+#
+#       $ SKUS          "item,sku" per item that
+#                       has one, item counting
+#                       from 0 in ITEMS
+#
+#   Items are read as (name, category, source,
+#   price, count, sku) tuples, sku '' for none.
+#
+#   read_fpn() parses the whole file before
+#   anything is added to the window, so the
+#   window can register everything in one batch.
+#
+#   Saves ending in .fpnb use the binary format
+#   below instead. read_save() and write_save()
+#   pick the format from the file name.
+#
+#   write_save() writes to a temporary file,
+#   syncs it and then renames it over the old
+#   save, so a crash while saving never leaves a
+#   half written file behind.
+#
+#   The readers and writers take an optional
+#   progress callback, called with (done, total)
+#   every PROGRESS_CHUNK items or so. It may
+#   raise to stop the read or write, which then
+#   leaves any old save untouched.
+
+import mmap
+import os
+import struct
+
+import numpy as np
+
+from itemstore import ItemStore, CodeTable
+
+BINARY_EXTENSION = '.fpnb'
+PROGRESS_CHUNK = 10000
+
+# items is a list of (name, category, source, price, count, sku), or
+# for a binary save an ItemStore filled straight from the file's columns
+
+class SavedInventory:
+
+    def __init__(self):
+        self.categories = []
+        self.sources = []
+        self.deals = dict()
+        self.items = []
+
+def read_fpn(filename, progress = None):
+    saved = SavedInventory()
+    section = None
+    skus = dict()
+    with open(filename, 'r') as f:
+        lines = f.read().splitlines()
+    for number, line in enumerate(lines, 1):
+        if progress is not None and number % PROGRESS_CHUNK == 0:
+            progress(number, len(lines))
+        if line == '':
+            continue
+        if line.startswith('$ '):
+            section = line[2:]
+        elif section == 'CATEGORIES':
+            saved.categories.append(line)
+        elif section == 'SOURCES':
+            saved.sources.append(line)
+        elif section == 'DEALS':
+            category, deal = line.rsplit(':', 1)
+            saved.deals[category] = parse_deal(deal)
+        elif section == 'ITEMS':
+
+            # Split from the right so a comma in a product name survives
+
+            name, category, source, price, count = line.rsplit(',', 4)
+            saved.items.append((name, category, source, float(price), int(count), ''))
+        elif section == 'SKUS':
+            row, sku = line.split(',', 1)
+            skus[int(row)] = sku
+    for row, sku in skus.items():
+        if row < len(saved.items):
+            saved.items[row] = saved.items[row][:5] + (sku,)
+    return saved
+
+# Deals are written as the repr of their tuple: ('BOGO', 2, 1) or ('BULK', 3, 5.0)
+
+def parse_deal(text):
+    kind, a, b = [field.strip() for field in text.strip().strip('()').split(',')]
+    kind = kind.strip('\'"')
+    if kind == 'BOGO':
+        return (kind, int(a), int(b))
+    elif kind == 'BULK':
+        return (kind, int(a), float(b))
+    raise ValueError('unknown deal ' + text)
+
+# Items are given as (name, category, source, price, count), with or
+# without a SKU after the count, or as an ItemStore (see itemstore.py)
+
+def write_fpn(filename, categories, sources, deals, items, progress = None):
+    if isinstance(items, ItemStore):
+        items = items.fields_list()
+    skus = [(row, item[5]) for row, item in enumerate(items) if len(item) > 5 and item[5]]
+    with open(filename, 'w+') as f:
+        f.write('$ CATEGORIES\n')
+        f.writelines([cat + '\n' for cat in categories if cat != '-'])
+        f.write('$ SOURCES\n')
+        f.writelines([src + '\n' for src in sources if src != '-'])
+        f.write('$ DEALS\n')
+        f.writelines([str(category) + ':' + str(deal) + '\n' for category, deal in deals.items() if deal is not None])
+        f.write('$ ITEMS\n')
+        for start in range(0, len(items), PROGRESS_CHUNK):
+            f.writelines([','.join([name, category, source, str(price), str(count)]) + '\n'
+                          for name, category, source, price, count, *sku in items[start:start + PROGRESS_CHUNK]])
+            if progress is not None:
+                progress(min(start + PROGRESS_CHUNK, len(items)), len(items))
+        if skus:
+            f.write('$ SKUS\n')
+            f.writelines([str(row) + ',' + sku + '\n' for row, sku in skus])
+        f.flush()
+        os.fsync(f.fileno())
+
+#################################################
+#
+#   Binary .fpnb save files.
+#
+#   A fixed header is followed by sections that
+#   each start on an 8 byte boundary:
+#
+#       header      magic, format version and
+#                   the length of every table
+#       price       float64 per item
+#       count       int32 per item
+#       category    uint32 per item, index into
+#                   the category table
+#       source      uint32 per item, index into
+#                   the source table
+#       deals       (category, kind, a, b) per
+#                   deal
+#       strings     categories, sources and
+#                   product names, each as
+#                   uint64 offsets into a UTF-8
+#                   blob
+#       skus        strings, one per item, only
+#                   when the FLAG_SKUS bit of
+#                   the header flags is set
+#
+#   Older readers skip the flag and the section
+#   after the names, so a file with SKUs still
+#   opens in them, without the SKUs.
+#
+#   All numbers are little-endian. FpnbFile
+#   maps the file and exposes every column as an
+#   array over the mapping, so nothing is read
+#   until it is used.
+
+BINARY_MAGIC = b'FPNB'
+BINARY_VERSION = 1
+FLAG_SKUS = 1
+
+HEADER = struct.Struct('<4sHHIIII8x')
+DEAL_DTYPE = np.dtype([('category', '<u4'), ('kind', '<u4'), ('a', '<i8'), ('b', '<f8')])
+DEAL_KINDS = ['BOGO', 'BULK']
+
+def padding(offset):
+    return -offset % 8
+
+class FpnbFile:
+
+    def __init__(self, filename):
+        with open(filename, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ)
+        magic, version, flags, num_items, num_categories, num_sources, num_deals = HEADER.unpack_from(self.map, 0)
+        if magic != BINARY_MAGIC:
+            self.close()
+            raise ValueError(filename + ' is not a 4Peanuts binary save')
+        if version > BINARY_VERSION:
+            self.close()
+            raise ValueError(filename + ' was saved by a newer version (format ' + str(version) + ')')
+        self.offset = HEADER.size
+        self.prices = self.column('<f8', num_items)
+        self.counts = self.column('<i4', num_items)
+        self.category_codes = self.column('<u4', num_items)
+        self.source_codes = self.column('<u4', num_items)
+        self.deal_table = self.column(DEAL_DTYPE, num_deals)
+        self.category_table = self.strings(num_categories)
+        self.source_table = self.strings(num_sources)
+        self.name_table = self.strings(num_items)
+        self.num_items = num_items
+        self.sku_table = self.strings(num_items) if flags & FLAG_SKUS else None
+
+    def column(self, dtype, length):
+        array = np.frombuffer(self.map, dtype = dtype, count = length, offset = self.offset)
+        self.offset += array.nbytes
+        self.offset += padding(self.offset)
+        return array
+
+    def strings(self, length):
+        offsets = self.column('<u8', length + 1)
+        blob_start = self.offset
+        self.offset += int(offsets[-1])
+        self.offset += padding(self.offset)
+        return offsets, blob_start
+
+    def decode(self, table):
+        offsets, blob_start = table
+        blob = self.map[blob_start:blob_start + int(offsets[-1])]
+        bounds = offsets.tolist()
+        return [blob[start:end].decode() for start, end in zip(bounds, bounds[1:])]
+
+    def categories(self):
+        return self.decode(self.category_table)
+
+    def sources(self):
+        return self.decode(self.source_table)
+
+    def names(self):
+        return self.decode(self.name_table)
+
+    def skus(self):
+        if self.sku_table is None:
+            return [''] * self.num_items
+        return self.decode(self.sku_table)
+
+    def deals(self):
+        categories = self.categories()
+        deals = dict()
+        for category, kind, a, b in self.deal_table.tolist():
+            kind = DEAL_KINDS[kind]
+            deals[categories[category]] = (kind, a, int(b) if kind == 'BOGO' else b)
+        return deals
+
+    # The arrays above are views of the mapping and must go before it is closed
+
+    def close(self):
+        self.prices = self.counts = self.category_codes = self.source_codes = self.deal_table = None
+        self.category_table = self.source_table = self.name_table = self.sku_table = None
+        self.map.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# The mapped columns are copied into an ItemStore as they are, codes
+# included, so the only per item work is decoding the names and SKUs
+
+def read_fpnb(filename, progress = None):
+    saved = SavedInventory()
+    with FpnbFile(filename) as f:
+        categories, sources = f.categories(), f.sources()
+        saved.categories = [category for category in categories if category != '-']
+        saved.sources = [source for source in sources if source != '-']
+        saved.deals = f.deals()
+        size = len(f.prices)
+        if size and (f.category_codes.max() >= len(categories) or f.source_codes.max() >= len(sources)):
+            raise ValueError(filename + ' has items with unknown categories or sources')
+        store = ItemStore(max(size, 1))
+        store.category_table = CodeTable(categories)
+        store.source_table = CodeTable(sources)
+        store.price_column[:size] = f.prices
+        store.count_column[:size] = f.counts
+        store.category_column[:size] = f.category_codes
+        store.source_column[:size] = f.source_codes
+        if progress is not None:
+            progress(1, 3)
+        store.names = f.names()
+        if progress is not None:
+            progress(2, 3)
+        store.skus = f.skus()
+        saved.items = store
+    if progress is not None:
+        progress(3, 3)
+    return saved
+
+def string_table(strings):
+    encoded = [string.encode() for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype = '<u8')
+    np.cumsum([len(string) for string in encoded], out = offsets[1:])
+    return [offsets.tobytes(), b''.join(encoded)]
+
+def write_fpnb(filename, categories, sources, deals, items, progress = None):
+    categories = ['-'] + [category for category in categories if category != '-']
+    sources = ['-'] + [source for source in sources if source != '-']
+    if isinstance(items, ItemStore):
+        categories += sorted(set(items.category_table.names).difference(categories))
+        sources += sorted(set(items.source_table.names).difference(sources))
+    category_codes = {category: code for code, category in enumerate(categories)}
+    source_codes = {source: code for code, source in enumerate(sources)}
+    deal_rows = [(category_codes[category], DEAL_KINDS.index(deal[0]), deal[1], deal[2])
+                 for category, deal in deals.items() if deal is not None and category in category_codes]
+    if isinstance(items, ItemStore):
+
+        # Map the store's own codes to this file's through a table per code
+
+        names, prices, counts, skus = items.names, items.prices, items.counts, items.skus
+        item_categories = np.array([category_codes[category] for category in items.category_table.names], dtype = '<u4')[items.category_codes]
+        item_sources = np.array([source_codes[source] for source in items.source_table.names], dtype = '<u4')[items.source_codes]
+    else:
+        columns = list(zip(*items)) or [[]] * 5
+        names, item_categories, item_sources, prices, counts = columns[:5]
+        skus = columns[5] if len(columns) > 5 else [item[5] if len(item) > 5 else '' for item in items]
+        item_categories = [category_codes[category] for category in item_categories]
+        item_sources = [source_codes[source] for source in item_sources]
+    flags = FLAG_SKUS if any(skus) else 0
+    sections = [
+        HEADER.pack(BINARY_MAGIC, BINARY_VERSION, flags, len(items), len(categories), len(sources), len(deal_rows)),
+        np.asarray(prices, dtype = '<f8').tobytes(),
+        np.asarray(counts, dtype = '<i4').tobytes(),
+        np.asarray(item_categories, dtype = '<u4').tobytes(),
+        np.asarray(item_sources, dtype = '<u4').tobytes(),
+        np.array(deal_rows, dtype = DEAL_DTYPE).tobytes(),
+    ]
+    if progress is not None:
+        progress(1, 4)
+    sections += string_table(categories) + string_table(sources) + string_table(names)
+    if flags & FLAG_SKUS:
+        sections += string_table(skus)
+    if progress is not None:
+        progress(2, 4)
+    with open(filename, 'wb') as f:
+        for section in sections:
+            f.write(section)
+            f.write(bytes(padding(len(section))))
+        if progress is not None:
+            progress(3, 4)
+        f.flush()
+        os.fsync(f.fileno())
+    if progress is not None:
+        progress(4, 4)
+
+#################################################
+#
+#   Format by extension.
+
+def is_binary(filename):
+    return filename.lower().endswith(BINARY_EXTENSION)
+
+def read_save(filename, progress = None):
+    if is_binary(filename):
+        return read_fpnb(filename, progress)
+    return read_fpn(filename, progress)
+
+def write_save(filename, categories, sources, deals, items, progress = None):
+    temp_name = filename + '.tmp'
+    try:
+        if is_binary(filename):
+            write_fpnb(temp_name, categories, sources, deals, items, progress)
+        else:
+            write_fpn(temp_name, categories, sources, deals, items, progress)
+    except BaseException:
+        if os.path.exists(temp_name):
+            os.remove(temp_name)
+        raise
+    os.replace(temp_name, filename)
@@ -0,0 +1,134 @@
+#################################################
+#
+#   class SearchIndex:
+#
+#   Trigram index over product names. Each
+#   trigram maps to the set of rows whose name
+#   contains it, so a search only has to check
+#   the rows that share every trigram of the
+#   query instead of every item.
+#
+#   Queries shorter than a trigram fall back to
+#   a scan of the lowercased names, narrowed to
+#   the previous result when the user is still
+#   typing the same word.
+#
+#   An index can also be built for a run of rows
+#   on its own, from first on, away from the GUI
+#   thread, and joined to the live index with
+#   merge() when the rows are added.
+#
+#   Each trigram's rows are kept in an array
+#   rather than a set. A merge is then a copy
+#   onto the end of each array, and the garbage
+#   collector has one object per trigram to
+#   visit instead of every row in it.
+
+from array import array
+from collections import defaultdict
+
+INDEX_CHUNK = 10000
+
+def trigrams(text):
+    return {text[i:i+3] for i in range(len(text)-2)}
+
+def rows_array():
+    return array('i')
+
+class SearchIndex:
+
+    def __init__(self, first = 0):
+        self.first = first
+        self.names = []
+        self.postings = defaultdict(rows_array)
+        self.last_query = ''
+        self.last_result = None
+
+    # Index names for the rows from first on. progress is called with
+    # (done, total) every INDEX_CHUNK names and may raise to stop.
+
+    def add_many(self, names, progress = None):
+        postings = self.postings
+        for row, name in enumerate(names, self.first + len(self.names)):
+            name = name.lower()
+            self.names.append(name)
+            for gram in trigrams(name):
+                postings[gram].append(row)
+            if progress is not None and row % INDEX_CHUNK == 0:
+                progress(row - self.first, len(names))
+        self.last_query, self.last_result = '', None
+
+    # Take in an index built for the rows that follow this one's
+
+    def merge(self, part):
+        if part.first != len(self.names):
+            raise ValueError(f'index starts at row {part.first}, not {len(self.names)}')
+        if not self.names:
+            self.names, self.postings = part.names, part.postings
+        else:
+            self.names.extend(part.names)
+            for gram, rows in part.postings.items():
+                existing = self.postings.get(gram)
+                if existing is None:
+                    self.postings[gram] = rows
+                else:
+                    existing.extend(rows)
+        self.last_query, self.last_result = '', None
+
+    def add(self, row, name):
+        name = name.lower()
+        new = row == len(self.names)
+        if new:
+            self.names.append(name)
+        else:
+            self.names[row] = name
+        for gram in trigrams(name):
+            rows = self.postings[gram]
+            if new or row not in rows:
+                rows.append(row)
+        self.last_query, self.last_result = '', None
+
+    def rename(self, row, name):
+        old_name = self.names[row]
+        new_name = name.lower()
+        if old_name == new_name:
+            return
+        old_grams, new_grams = trigrams(old_name), trigrams(new_name)
+        for gram in old_grams - new_grams:
+            rows = self.postings[gram]
+            rows.remove(row)
+            if not rows:
+                del self.postings[gram]
+        for gram in new_grams - old_grams:
+            self.postings[gram].append(row)
+        self.names[row] = new_name
+        self.last_query, self.last_result = '', None
+
+    def clear(self):
+        self.names = []
+        self.postings = defaultdict(rows_array)
+        self.last_query, self.last_result = '', None
+
+    # Return the set of matching rows, or None if every row matches
+
+    def search(self, query):
+        query = query.lower()
+        if query == '':
+            result = None
+        elif self.last_result is not None and self.last_query and self.last_query in query:
+            result = {row for row in self.last_result if query in self.names[row]}
+        elif len(query) < 3:
+            result = {row for row, name in enumerate(self.names) if query in name}
+        else:
+            candidates = None
+            for gram in sorted(trigrams(query), key = lambda gram: len(self.postings.get(gram, ()))):
+                rows = self.postings.get(gram)
+                if not rows:
+                    candidates = set()
+                    break
+                candidates = set(rows) if candidates is None else candidates.intersection(rows)
+                if not candidates:
+                    break
+            result = {row for row in candidates if query in self.names[row]}
+        self.last_query, self.last_result = query, result
+        return result
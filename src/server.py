@@ -0,0 +1,265 @@
+#################################################
+#
+#   Station server.
+#
+#   Lets the registers at one booth share a
+#   single inventory. The server owns the items,
+#   deals, autosave and logs; each 4Peanuts window
+#   connects to it (File > Connect to Station) and
+#   works on a copy that the server keeps up to
+#   date.
+#
+#       python server.py --host 0.0.0.0 --port 4848
+#
+#   Only the standard library and the headless
+#   core (core.py) are used, over plain TCP, so it
+#   runs on any of the laptops and needs nothing
+#   but the local network.
+#
+#   Messages are one JSON object per line, both
+#   ways. Requests carry an id the reply repeats:
+#
+#       {"id": 1, "op": "hello"}
+#           -> {"id": 1, "ok": true, "inventory":
+#                {"categories": [...], "sources":
+#                 [...], "deals": {...}, "items":
+#                 [[name, category, source, price,
+#                   count, sku], ...]}}
+#
+#       {"id": 2, "op": "record", "entries": [...]}
+#           Changes made at a station: category,
+#           source and deal entries as in the
+#           autosave journal, and item entries
+#           holding only the fields that changed
+#           (see change_entry() in autosave.py)
+#           -> {"id": 2, "ok": true}
+#
+#       {"id": 3, "op": "add", "items": [[name,
+#        category, source, price, count, sku]]}
+#           -> {"id": 3, "ok": true, "rows": [...]}
+#
+#       {"id": 4, "op": "sell", "time": iso,
+#        "lines": [[row, name, quantity], ...]}
+#           -> {"id": 4, "ok": true, "amount": 9.5,
+#                "lines": [[name, category, qty]]}
+#           -> {"id": 4, "ok": false, "error": ...,
+#                "stock": {row: count}}
+#
+#   Stations never set a count. They send the
+#   change in stock of a restock or correction,
+#   and sales only go through "sell", so a
+#   station still showing units another station
+#   sold cannot put them back. Stations do not
+#   add items themselves either: the server gives
+#   new items the next rows and sends them to
+#   every station, so two stations adding at
+#   once each get their own row.
+#
+#   A sale is all or nothing. The station does not
+#   reserve stock while ringing up; the server
+#   checks every line against the current counts
+#   when the sale arrives, and rejects the whole
+#   sale if any item is short or its row now holds
+#   a different item. Requests are handled one at
+#   a time between awaits, so two stations can
+#   never both sell the last unit.
+#
+#   Every change, from whichever station, is then
+#   pushed to all stations as journal entries:
+#
+#       {"op": "update", "entries": [...]}
+
+import argparse
+import asyncio
+import json
+import sys
+from datetime import datetime
+
+from core import Inventory
+from autosave import EditJournal, apply_entry, apply_change, item_entries
+from lifetime import LifetimeStats, LIFETIME_LOG
+from dailylog import DailyLogWriter, LOG_DIR, FLUSH_ON_IDLE
+
+HOST = '127.0.0.1'
+PORT = 4848
+SERVER_AUTOSAVE = './saves/server.fpnb'
+
+# Longest message read, which opening a big save file at a station can
+# approach, and most a station's unsent updates may queue before it is
+# dropped as stuck
+
+MAX_MESSAGE = 64 * 1024 * 1024
+MAX_CLIENT_BUFFER = 16 * 1024 * 1024
+
+#################################################
+#
+#   class Broadcaster:
+#
+#   Sits between the Inventory and its autosave
+#   journal, passing changes on and collecting
+#   them to push to the stations.
+
+class Broadcaster:
+
+    def __init__(self, inventory, journal = None):
+        self.inventory = inventory
+        self.journal = journal
+        self.entries = []
+
+    def record(self, entries):
+        if self.journal is not None:
+            self.journal.record(entries)
+        self.entries.extend(entries)
+
+    def items_changed(self, rows):
+        self.record(item_entries(self.inventory, rows))
+
+    def take(self):
+        entries, self.entries = self.entries, []
+        return entries
+
+    def close(self):
+        if self.journal is not None:
+            self.journal.close()
+
+class StationServer:
+
+    def __init__(self, inventory):
+        self.inventory = inventory
+        self.broadcaster = Broadcaster(inventory, inventory.journal)
+        inventory.attach_journal(self.broadcaster)
+        self.clients = set()
+
+    def snapshot(self):
+        inventory = self.inventory
+        return {
+            'categories': list(inventory.categories),
+            'sources': list(inventory.sources),
+            'deals': inventory.deals,
+            'items': inventory.items.fields_list(),
+        }
+
+    def apply_changes(self, entries):
+        for entry in entries:
+            if 'item' in entry:
+                apply_change(self.inventory, entry)
+            elif {'category', 'source', 'deal'}.intersection(entry):
+                apply_entry(self.inventory, entry)
+            else:
+                raise KeyError(f'stations cannot record {entry!r}')
+        return {}
+
+    # New items go after whatever other stations added meanwhile
+
+    def add_items(self, items):
+        first = self.inventory.add_items([self.inventory.new_item(*fields) for fields in items])
+        return {'rows': list(range(first, len(self.inventory.items)))}
+
+    def sell(self, lines, when):
+        inventory = self.inventory
+        when = datetime.fromisoformat(when) if when else None
+        wanted = dict()
+        for row, name, quantity in lines:
+            if row >= len(inventory.items) or inventory.items[row].product_name != name:
+                return {'ok': False, 'error': f'{name} changed at another station', 'stock': {}}
+            wanted[row] = wanted.get(row, 0) + max(0, quantity)
+        short = {row: inventory.items[row].inv_count for row, quantity in wanted.items() if inventory.items[row].inv_count < quantity}
+        if short:
+            names = ', '.join(inventory.items[row].product_name for row in short)
+            return {'ok': False, 'error': 'Not enough in stock: ' + names, 'stock': short}
+
+        for row, quantity in wanted.items():
+            inventory.set_sell_count(row, quantity)
+        sold_rows, (when, sold, amount) = inventory.complete_sale(when)
+        return {'amount': amount, 'lines': sold, 'time': when.isoformat()}
+
+    def handle(self, request):
+        op = request.get('op')
+        if op == 'hello':
+            return {'inventory': self.snapshot()}
+        elif op == 'record':
+            return self.apply_changes(request['entries'])
+        elif op == 'add':
+            return self.add_items(request['items'])
+        elif op == 'sell':
+            return self.sell(request['lines'], request.get('time'))
+        return {'ok': False, 'error': f'unknown op {op!r}'}
+
+    def send(self, writer, message):
+        if writer.transport.get_write_buffer_size() > MAX_CLIENT_BUFFER:
+            writer.close()
+            return
+        writer.write((json.dumps(message) + '\n').encode())
+
+    def broadcast(self):
+        entries = self.broadcaster.take()
+        if entries:
+            for writer in list(self.clients):
+                self.send(writer, {'op': 'update', 'entries': entries})
+
+    async def serve_client(self, reader, writer):
+        self.clients.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                request = None
+                try:
+                    request = json.loads(line)
+                    reply = {'ok': True}
+                    reply.update(self.handle(request))
+                except (ValueError, KeyError, IndexError, TypeError) as error:
+                    reply = {'ok': False, 'error': f'bad request: {error}'}
+                reply['id'] = request.get('id') if isinstance(request, dict) else None
+
+                # The reply goes out before the update it caused, so the
+                # station knows its sale went through before the counts move
+
+                self.send(writer, reply)
+                self.broadcast()
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.clients.discard(writer)
+            writer.close()
+
+    async def run(self, host = HOST, port = PORT):
+        server = await asyncio.start_server(self.serve_client, host, port, limit = MAX_MESSAGE)
+        for sock in server.sockets:
+            print('Serving on ' + str(sock.getsockname()[:2]))
+        async with server:
+            await server.serve_forever()
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(prog = 'server.py', description = 'Share one 4Peanuts inventory between stations')
+    parser.add_argument('--host', default = HOST, help = 'address to listen on, 0.0.0.0 for every network')
+    parser.add_argument('--port', type = int, default = PORT)
+    parser.add_argument('--autosave', default = SERVER_AUTOSAVE, help = 'where the served inventory is kept between runs')
+    parser.add_argument('--open', help = 'add the items of a .fpn or .fpnb save file')
+    parser.add_argument('--log-dir', default = LOG_DIR)
+    parser.add_argument('--lifetime', default = LIFETIME_LOG)
+    args = parser.parse_args(argv)
+
+    inventory = Inventory(
+        lifetime_stats = LifetimeStats(args.lifetime, background = True),
+        daily_log = DailyLogWriter(policy = FLUSH_ON_IDLE, log_dir = args.log_dir),
+        )
+    autosave = EditJournal(inventory, args.autosave, background = True)
+    autosave.load()
+    inventory.attach_journal(autosave)
+    if args.open:
+        inventory.open(args.open)
+    print(f'{len(inventory.items)} items')
+
+    try:
+        asyncio.run(StationServer(inventory).run(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        inventory.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
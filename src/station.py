@@ -0,0 +1,134 @@
+#################################################
+#
+#   class StationClient:
+#
+#   The window's connection to the station
+#   server (server.py). Speaks the server's JSON
+#   lines over a QTcpSocket, so replies and
+#   pushed updates arrive on the GUI thread like
+#   any other signal.
+#
+#   Once connected, the window attaches a
+#   StationJournal to its Inventory in place of
+#   the local autosave, which sends each change
+#   to the server instead of writing it to disk.
+#   Items are only ever added by the server (see
+#   add_items()), and an edited row is sent as the
+#   fields that differ from what the server last
+#   sent for it, so the server's counts are never
+#   overwritten with this station's.
+
+import json
+
+from PyQt6.QtCore import QObject, pyqtSignal
+from PyQt6.QtNetwork import QAbstractSocket, QTcpSocket
+
+from autosave import change_entry
+from savefile import SavedInventory
+from itemstore import ItemStore
+
+class StationClient(QObject):
+
+    # Emitted with the server's inventory as a SavedInventory
+
+    connected = pyqtSignal(object)
+
+    # Emitted with the journal entries of changes made at any station
+
+    updated = pyqtSignal(list)
+
+    failed = pyqtSignal(str)
+    disconnected = pyqtSignal()
+
+    def __init__(self, parent = None):
+        super().__init__(parent)
+        self.socket = QTcpSocket(self)
+        self.socket.connected.connect(lambda: self.request('hello', self.hello_done))
+        self.socket.readyRead.connect(self.read_messages)
+        self.socket.errorOccurred.connect(self.socket_error)
+        self.socket.disconnected.connect(self.disconnected)
+        self.next_id = 0
+        self.callbacks = dict()
+
+    def connect_to(self, host, port):
+        self.socket.connectToHost(host, port)
+
+    def close(self):
+        self.socket.disconnectFromHost()
+
+    # Send a request; callback is given the reply as a dict
+
+    def request(self, op, callback = None, **fields):
+        self.next_id += 1
+        if callback is not None:
+            self.callbacks[self.next_id] = callback
+        self.socket.write((json.dumps(dict(fields, id = self.next_id, op = op)) + '\n').encode())
+
+    # Have the server add items, given as (name, category, source, price,
+    # count, sku) or an ItemStore. They arrive back as an update like any other
+    # station's; callback is given their rows.
+
+    def add_items(self, items, callback = None):
+        if isinstance(items, ItemStore):
+            items = items.fields_list()
+        self.request('add', lambda reply: callback(reply.get('rows', [])) if callback is not None else None,
+                     items = [list(item) for item in items])
+
+    def hello_done(self, reply):
+        inventory = reply['inventory']
+        saved = SavedInventory()
+        saved.categories = inventory['categories']
+        saved.sources = inventory['sources']
+        saved.deals = {category: tuple(deal) if deal is not None else None for category, deal in inventory['deals'].items()}
+        saved.items = [tuple(fields) for fields in inventory['items']]
+        self.connected.emit(saved)
+
+    def read_messages(self):
+        while self.socket.canReadLine():
+            message = json.loads(bytes(self.socket.readLine()))
+            if message.get('op') == 'update':
+                self.updated.emit(message['entries'])
+                continue
+            callback = self.callbacks.pop(message.get('id'), None)
+            if callback is not None:
+                callback(message)
+
+    def socket_error(self, error):
+        if error != QAbstractSocket.SocketError.RemoteHostClosedError:
+            self.failed.emit(self.socket.errorString())
+
+class StationJournal:
+
+    def __init__(self, inventory, client):
+        self.inventory = inventory
+        self.client = client
+        self.known = inventory.items.fields_list()
+
+    def record(self, entries):
+        if entries:
+            self.client.request('record', entries = entries)
+
+    def items_changed(self, rows):
+        entries = []
+        for row in rows:
+            if row >= len(self.known):
+                continue
+            fields = self.inventory.items[row].fields()
+            entry = change_entry(row, self.known[row], fields)
+            if entry is not None:
+                entries.append(entry)
+                self.known[row] = fields
+        self.record(entries)
+
+    # Rows the server has just sent, which are what it now holds
+
+    def synced(self, rows):
+        for row in rows:
+            fields = self.inventory.items[row].fields()
+            if row < len(self.known):
+                self.known[row] = fields
+            else:
+                self.known.append(fields)
+
+    def close(self):
+        pass
@@ -0,0 +1,57 @@
+#################################################
+#
+#   class Worker:
+#
+#   Runs a function on a QThreadPool thread and
+#   reports its result or error back through
+#   signals, which are delivered on the GUI
+#   thread.
+#
+#   Made with with_progress = True, the function
+#   is also passed progress = worker.report, to
+#   call with (done, total) as it goes. Once
+#   cancel() has been called, the next report
+#   raises Cancelled, so the function stops at a
+#   point of its choosing and the cancelled
+#   signal is sent instead of finished.
+
+from PyQt6.QtCore import QObject, QRunnable, pyqtSignal
+
+class Cancelled(Exception):
+    pass
+
+class WorkerSignals(QObject):
+    finished = pyqtSignal(object)
+    error = pyqtSignal(str)
+    progress = pyqtSignal(int, int)
+    cancelled = pyqtSignal()
+
+class Worker(QRunnable):
+
+    def __init__(self, fn, *args, with_progress = False, **kwargs):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = WorkerSignals()
+        self.is_cancelled = False
+        if with_progress:
+            self.kwargs['progress'] = self.report
+
+    def cancel(self):
+        self.is_cancelled = True
+
+    def report(self, done, total):
+        if self.is_cancelled:
+            raise Cancelled()
+        self.signals.progress.emit(done, total)
+
+    def run(self):
+        try:
+            result = self.fn(*self.args, **self.kwargs)
+        except Cancelled:
+            self.signals.cancelled.emit()
+        except Exception as error:
+            self.signals.error.emit(str(error))
+        else:
+            self.signals.finished.emit(result)